@@ -8,6 +8,10 @@ from flask import Flask
 from flask_cors import CORS
 
 from .config import Config
+from .utils import OrjsonProvider
+
+# Directories already created by this process
+_ready_dirs = set()
 
 
 def create_app(config_class=Config):
@@ -22,25 +26,83 @@ def create_app(config_class=Config):
     """
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.json = OrjsonProvider(app)
 
-    # Enable CORS
-    CORS(app)
+    # Enable CORS for the API only - the HTML pages are served same-origin
+    CORS(
+        app,
+        resources={r'/api/*': {'origins': app.config['CORS_ORIGINS']}},
+        send_wildcard=True
+    )
 
     # Ensure upload directories exist
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    os.makedirs(app.config['PROCESSED_FOLDER'], exist_ok=True)
+    ensure_dirs(app.config['UPLOAD_FOLDER'], app.config['PROCESSED_FOLDER'])
+
+    # Match routes with or without a trailing slash instead of redirecting
+    app.url_map.strict_slashes = False
 
     # Register blueprints
     from app.routes import api_bp, main_bp
+    from app.routes_common import configure
+    configure(app)
     app.register_blueprint(main_bp)
     app.register_blueprint(api_bp, url_prefix='/api')
 
+    # Compile the URL map now rather than on the first request
+    app.url_map.update()
+
+    # Load recognition models once per process, before the first request
+    register_services(app)
+
     # Register error handlers
     register_error_handlers(app)
 
     return app
 
 
+def ensure_dirs(*paths):
+    """
+    Create directories once per process
+
+    Factories run repeatedly (per test, per reload), so paths created
+    earlier are skipped without touching the filesystem. A path nested
+    inside another is created along with it by a single makedirs call.
+
+    Args:
+        paths: Directories to create
+    """
+    pending = [path for path in paths if path not in _ready_dirs]
+    for path in pending:
+        if any(other != path and other.startswith(os.path.join(path, '')) for other in pending):
+            continue
+        os.makedirs(path, exist_ok=True)
+    _ready_dirs.update(pending)
+
+
+def register_services(app):
+    """Instantiate the recognition services and attach them to the application"""
+    from app.services import FacialRecognitionService, ObjectDetectionService
+
+    app.extensions['face_service'] = FacialRecognitionService(
+        cascade_path=app.config.get('FACE_CASCADE_PATH'),
+        confidence_threshold=app.config.get('FACE_DETECTION_CONFIDENCE', 0.5),
+        model_path=app.config.get('FACE_DETECTOR_MODEL_PATH'),
+        annotate_video=app.config.get('ANNOTATE_VIDEO', True)
+    )
+    app.extensions['object_service'] = ObjectDetectionService(
+        weights_path=app.config.get('YOLO_WEIGHTS_PATH'),
+        config_path=app.config.get('YOLO_CONFIG_PATH'),
+        names_path=app.config.get('YOLO_NAMES_PATH'),
+        confidence_threshold=app.config.get('OBJECT_DETECTION_CONFIDENCE', 0.5),
+        nms_threshold=app.config.get('NMS_THRESHOLD', 0.4),
+        use_cuda=app.config.get('YOLO_USE_CUDA', False),
+        batch_size=app.config.get('YOLO_BATCH_SIZE', 8),
+        annotate_video=app.config.get('ANNOTATE_VIDEO', True),
+        model_format=app.config.get('YOLO_MODEL_FORMAT', 'darknet'),
+        batch_window=app.config.get('YOLO_BATCH_WINDOW_MS', 0) / 1000
+    )
+
+
 def register_error_handlers(app):
     """Register error handlers for the application"""
 
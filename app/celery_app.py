@@ -4,6 +4,7 @@ Celery application configuration for distributed task processing
 import os
 
 from celery import Celery
+from kombu import Queue
 
 # Initialize Celery
 celery_app = Celery(
@@ -18,20 +19,41 @@ celery_app = Celery(
 
 # Celery configuration
 celery_app.conf.update(
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    task_serializer='msgpack',
+    accept_content=['msgpack', 'json'],  # json kept so queued tasks from older producers still run
+    result_serializer='msgpack',
+    result_compression='zlib',  # detection results (bbox lists, per-frame metadata) compress well
     timezone='UTC',
     enable_utc=True,
     task_track_started=True,
+    task_ignore_result=False,  # get_task_status reads results from the backend
+    result_expires=int(os.getenv('CELERY_RESULT_EXPIRES', 3600)),  # Drop unpolled results after an hour
     task_time_limit=30 * 60,  # 30 minutes
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,  # One task at a time for compute-intensive work
     worker_max_tasks_per_child=50,  # Restart worker after 50 tasks to prevent memory leaks
+    # Fail fast when Redis is down so uploads get a 503 instead of hanging the web worker
+    broker_connection_timeout=2,
+    task_publish_retry_policy={'max_retries': 2, 'interval_start': 0, 'interval_step': 0.2},
+    result_backend_transport_options={
+        'retry_policy': {'max_retries': 2, 'interval_start': 0, 'interval_step': 0.2},
+    },
 )
 
-# Task routing - direct face tasks to face workers, object tasks to object workers
+# Task queues - images and videos are split so long-running video jobs never
+# sit in front of short image jobs; GPU hosts can subscribe to the object queues only
+celery_app.conf.task_queues = (
+    Queue('face_detection'),
+    Queue('face_video'),
+    Queue('object_detection'),
+    Queue('object_video'),
+)
+celery_app.conf.task_default_queue = 'face_detection'
+
+# Task routing - direct each task to the queue for its workload
 celery_app.conf.task_routes = {
-    'app.tasks.face_tasks.*': {'queue': 'face_detection'},
-    'app.tasks.object_tasks.*': {'queue': 'object_detection'},
+    'app.tasks.face_tasks.detect_faces_in_image': {'queue': 'face_detection'},
+    'app.tasks.face_tasks.detect_faces_in_video': {'queue': 'face_video'},
+    'app.tasks.object_tasks.detect_objects_in_image': {'queue': 'object_detection'},
+    'app.tasks.object_tasks.detect_objects_in_video': {'queue': 'object_video'},
 }
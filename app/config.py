@@ -2,15 +2,14 @@
 Configuration settings for the Recognize application
 """
 import os
-from pathlib import Path
 
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Base directory
-BASE_DIR = Path(__file__).resolve().parent.parent
+# Base directory, resolved once as a plain string
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
 
 
 class Config:
@@ -21,41 +20,64 @@ class Config:
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 
     # File upload settings
-    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', str(BASE_DIR / 'uploads'))
-    PROCESSED_FOLDER = os.getenv('PROCESSED_FOLDER', str(BASE_DIR / 'uploads' / 'processed'))
+    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(BASE_DIR, 'uploads'))
+    PROCESSED_FOLDER = os.getenv('PROCESSED_FOLDER', os.path.join(BASE_DIR, 'uploads', 'processed'))
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 100 * 1024 * 1024))  # 100MB default
-    ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
-    ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'flv', 'wmv'}
+    ALLOWED_IMAGE_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'bmp'})
+    ALLOWED_VIDEO_EXTENSIONS = frozenset({'mp4', 'avi', 'mov', 'mkv', 'flv', 'wmv'})
+
+    # File download settings - hand large transfers off to the front-end server
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'False').lower() == 'true'  # Apache / lighttpd
+    X_ACCEL_REDIRECT_PREFIX = os.getenv('X_ACCEL_REDIRECT_PREFIX', '')  # nginx, e.g. /_internal_uploads/
 
     # Model paths
-    MODELS_DIR = os.getenv('MODELS_DIR', str(BASE_DIR / 'models'))
+    MODELS_DIR = os.getenv('MODELS_DIR', os.path.join(BASE_DIR, 'models'))
     FACE_CASCADE_PATH = os.getenv(
         'FACE_CASCADE_PATH',
-        str(Path(MODELS_DIR) / 'haarcascade_frontalface_default.xml')
+        os.path.join(MODELS_DIR, 'haarcascade_frontalface_default.xml')
+    )
+    FACE_DETECTOR_MODEL_PATH = os.getenv(
+        'FACE_DETECTOR_MODEL_PATH',
+        os.path.join(MODELS_DIR, 'face_detection_yunet_2023mar.onnx')
     )
-    YOLO_WEIGHTS_PATH = os.getenv('YOLO_WEIGHTS_PATH', str(Path(MODELS_DIR) / 'yolov3.weights'))
-    YOLO_CONFIG_PATH = os.getenv('YOLO_CONFIG_PATH', str(Path(MODELS_DIR) / 'yolov3.cfg'))
-    YOLO_NAMES_PATH = os.getenv('YOLO_NAMES_PATH', str(Path(MODELS_DIR) / 'coco.names'))
+    YOLO_WEIGHTS_PATH = os.getenv('YOLO_WEIGHTS_PATH', os.path.join(MODELS_DIR, 'yolov3.weights'))
+    YOLO_CONFIG_PATH = os.getenv('YOLO_CONFIG_PATH', os.path.join(MODELS_DIR, 'yolov3.cfg'))
+    YOLO_NAMES_PATH = os.getenv('YOLO_NAMES_PATH', os.path.join(MODELS_DIR, 'coco.names'))
+    # 'darknet' (YOLOv3 cfg + weights) or 'yolov8' (YOLO_WEIGHTS_PATH is an exported ONNX model)
+    YOLO_MODEL_FORMAT = os.getenv('YOLO_MODEL_FORMAT', 'darknet')
 
     # Recognition settings
     FACE_DETECTION_CONFIDENCE = float(os.getenv('FACE_DETECTION_CONFIDENCE', 0.5))
     OBJECT_DETECTION_CONFIDENCE = float(os.getenv('OBJECT_DETECTION_CONFIDENCE', 0.5))
     NMS_THRESHOLD = float(os.getenv('NMS_THRESHOLD', 0.4))
+    YOLO_USE_CUDA = os.getenv('YOLO_USE_CUDA', 'False').lower() == 'true'  # Needs a CUDA OpenCV build
+    # Sampled video frames per forward pass, max 16; frames in between are buffered until it runs
+    YOLO_BATCH_SIZE = int(os.getenv('YOLO_BATCH_SIZE', 8))
+    # Time to hold an image request for concurrent ones to share its forward pass; 0
+    # batches only requests already waiting, adding no latency
+    YOLO_BATCH_WINDOW_MS = float(os.getenv('YOLO_BATCH_WINDOW_MS', 0))
 
     # Processing settings
     MAX_IMAGE_DIMENSION = int(os.getenv('MAX_IMAGE_DIMENSION', 1920))
     VIDEO_FRAME_SKIP = int(os.getenv('VIDEO_FRAME_SKIP', 5))  # Process every Nth frame
+    # False writes video detections to annotations_<name>.json instead of re-encoding the video
+    ANNOTATE_VIDEO = os.getenv('ANNOTATE_VIDEO', 'True').lower() == 'true'
+    # Evict queued video uploads from the web host's page cache once written; for
+    # workers on other hosts, where the web host never reads the file again
+    UPLOAD_DROP_PAGE_CACHE = os.getenv('UPLOAD_DROP_PAGE_CACHE', 'False').lower() == 'true'
 
     # API settings
     API_RATE_LIMIT = os.getenv('API_RATE_LIMIT', '100 per hour')
+    CORS_ORIGINS = [origin.strip() for origin in os.getenv('CORS_ORIGINS', '*').split(',')]
 
     # Celery / Task Queue settings
+    USE_TASK_QUEUE = os.getenv('USE_TASK_QUEUE', 'False').lower() == 'true'  # Queue videos on workers
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
     CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
 
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
-    LOG_FILE = os.getenv('LOG_FILE', str(BASE_DIR / 'recognize.log'))
+    LOG_FILE = os.getenv('LOG_FILE', os.path.join(BASE_DIR, 'recognize.log'))
 
 
 class DevelopmentConfig(Config):
@@ -71,7 +93,7 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
-    UPLOAD_FOLDER = str(BASE_DIR / 'tests' / 'uploads')
+    UPLOAD_FOLDER = os.path.join(BASE_DIR, 'tests', 'uploads')
 
 
 # Configuration dictionary
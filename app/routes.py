@@ -2,11 +2,21 @@
 Flask routes for the Recognize application
 """
 import logging
-
-from flask import Blueprint, current_app, render_template, request, send_from_directory
-
-from app.services import FacialRecognitionService, ObjectDetectionService
-from app.utils.file_handler import FileHandler
+from functools import partial
+
+from flask import Blueprint, render_template
+
+from app.routes_common import (
+    DISPATCH,
+    download_file,
+    enqueue,
+    get_celery_tasks,
+    get_task_status,
+    handle_api_error,
+    read_frame_skip,
+    receive_upload,
+)
+from app.services._singletons import face_service, object_service
 from app.utils.response_handler import ResponseHandler
 
 logger = logging.getLogger(__name__)
@@ -15,34 +25,18 @@ logger = logging.getLogger(__name__)
 main_bp = Blueprint('main', __name__)
 api_bp = Blueprint('api', __name__)
 
-# Initialize services (will be properly configured on first use)
-face_service = None
-object_service = None
-
+# Service names used in responses
+_SERVICE_LABELS = {
+    'face': 'Facial recognition',
+    'object': 'Object detection',
+}
 
-def get_face_service():
-    """Get or initialize facial recognition service"""
-    global face_service
-    if face_service is None:
-        face_service = FacialRecognitionService(
-            cascade_path=current_app.config.get('FACE_CASCADE_PATH'),
-            confidence_threshold=current_app.config.get('FACE_DETECTION_CONFIDENCE', 0.5)
-        )
-    return face_service
-
-
-def get_object_service():
-    """Get or initialize object detection service"""
-    global object_service
-    if object_service is None:
-        object_service = ObjectDetectionService(
-            weights_path=current_app.config.get('YOLO_WEIGHTS_PATH'),
-            config_path=current_app.config.get('YOLO_CONFIG_PATH'),
-            names_path=current_app.config.get('YOLO_NAMES_PATH'),
-            confidence_threshold=current_app.config.get('OBJECT_DETECTION_CONFIDENCE', 0.5),
-            nms_threshold=current_app.config.get('NMS_THRESHOLD', 0.4)
-        )
-    return object_service
+# Pre-serialized health check body, see ResponseHandler.preformatted
+_HEALTH_TEMPLATE = (
+    b'{"success":true,"message":"Success","timestamp":"%s","data":{"status":"healthy",'
+    b'"services":{"facial_recognition":%s,"object_detection":%s}}}'
+)
+_JSON_BOOL = {True: b'true', False: b'false'}
 
 
 # Web Interface Routes
@@ -68,197 +62,68 @@ def results_page(filename):
 @api_bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    face_svc = get_face_service()
-    obj_svc = get_object_service()
-
-    return ResponseHandler.success({
-        'status': 'healthy',
-        'services': {
-            'facial_recognition': face_svc.is_available(),
-            'object_detection': obj_svc.is_available()
-        }
-    })
-
-
-@api_bp.route('/detect/face/image', methods=['POST'])
-def detect_face_image():
-    """Detect faces in an uploaded image"""
-    try:
-        # Validate and save file
-        if 'file' not in request.files:
-            return ResponseHandler.error('No file provided', 400)
-
-        file = request.files['file']
-        if file.filename == '':
-            return ResponseHandler.error('No file selected', 400)
-
-        # Validate file type
-        allowed_exts = current_app.config['ALLOWED_IMAGE_EXTENSIONS']
-        if not FileHandler.allowed_file(file.filename, allowed_exts):
-            return ResponseHandler.error(
-                f"Invalid file type. Allowed: {', '.join(allowed_exts)}",
-                400
-            )
-
-        # Save file
-        filepath = FileHandler.save_upload(file, current_app.config['UPLOAD_FOLDER'])
-
-        # Process image
-        face_svc = get_face_service()
-        if not face_svc.is_available():
-            return ResponseHandler.error('Facial recognition service not available', 503)
-
-        result = face_svc.detect_faces_in_image(filepath)
-
-        if result['success']:
-            return ResponseHandler.success(result)
-        else:
-            return ResponseHandler.error(result.get('error', 'Detection failed'), 500)
-
-    except Exception as e:
-        logger.error(f"Error in face detection: {e}")
-        return ResponseHandler.error(str(e), 500)
-
-
-@api_bp.route('/detect/face/video', methods=['POST'])
-def detect_face_video():
-    """Detect faces in an uploaded video"""
-    try:
-        # Validate and save file
-        if 'file' not in request.files:
-            return ResponseHandler.error('No file provided', 400)
-
-        file = request.files['file']
-        if file.filename == '':
-            return ResponseHandler.error('No file selected', 400)
-
-        # Validate file type
-        allowed_exts = current_app.config['ALLOWED_VIDEO_EXTENSIONS']
-        if not FileHandler.allowed_file(file.filename, allowed_exts):
-            return ResponseHandler.error(
-                f"Invalid file type. Allowed: {', '.join(allowed_exts)}",
-                400
-            )
-
-        # Save file
-        filepath = FileHandler.save_upload(file, current_app.config['UPLOAD_FOLDER'])
-
-        # Get frame skip parameter
-        frame_skip = request.form.get(
-            'frame_skip',
-            current_app.config.get('VIDEO_FRAME_SKIP', 5),
-            type=int
-        )
-
-        # Process video
-        face_svc = get_face_service()
-        if not face_svc.is_available():
-            return ResponseHandler.error('Facial recognition service not available', 503)
-
-        result = face_svc.detect_faces_in_video(filepath, frame_skip=frame_skip)
-
-        if result['success']:
-            return ResponseHandler.success(result)
-        else:
-            return ResponseHandler.error(result.get('error', 'Detection failed'), 500)
-
-    except Exception as e:
-        logger.error(f"Error in face detection: {e}")
-        return ResponseHandler.error(str(e), 500)
-
-
-@api_bp.route('/detect/object/image', methods=['POST'])
-def detect_object_image():
-    """Detect objects in an uploaded image"""
-    try:
-        # Validate and save file
-        if 'file' not in request.files:
-            return ResponseHandler.error('No file provided', 400)
-
-        file = request.files['file']
-        if file.filename == '':
-            return ResponseHandler.error('No file selected', 400)
-
-        # Validate file type
-        allowed_exts = current_app.config['ALLOWED_IMAGE_EXTENSIONS']
-        if not FileHandler.allowed_file(file.filename, allowed_exts):
-            return ResponseHandler.error(
-                f"Invalid file type. Allowed: {', '.join(allowed_exts)}",
-                400
-            )
-
-        # Save file
-        filepath = FileHandler.save_upload(file, current_app.config['UPLOAD_FOLDER'])
-
-        # Process image
-        obj_svc = get_object_service()
-        if not obj_svc.is_available():
-            return ResponseHandler.error('Object detection service not available', 503)
-
-        result = obj_svc.detect_objects_in_image(filepath)
-
-        if result['success']:
-            return ResponseHandler.success(result)
-        else:
-            return ResponseHandler.error(result.get('error', 'Detection failed'), 500)
-
-    except Exception as e:
-        logger.error(f"Error in object detection: {e}")
-        return ResponseHandler.error(str(e), 500)
-
-
-@api_bp.route('/detect/object/video', methods=['POST'])
-def detect_object_video():
-    """Detect objects in an uploaded video"""
-    try:
-        # Validate and save file
-        if 'file' not in request.files:
-            return ResponseHandler.error('No file provided', 400)
-
-        file = request.files['file']
-        if file.filename == '':
-            return ResponseHandler.error('No file selected', 400)
-
-        # Validate file type
-        allowed_exts = current_app.config['ALLOWED_VIDEO_EXTENSIONS']
-        if not FileHandler.allowed_file(file.filename, allowed_exts):
-            return ResponseHandler.error(
-                f"Invalid file type. Allowed: {', '.join(allowed_exts)}",
-                400
-            )
-
-        # Save file
-        filepath = FileHandler.save_upload(file, current_app.config['UPLOAD_FOLDER'])
-
-        # Get frame skip parameter
-        frame_skip = request.form.get(
-            'frame_skip',
-            current_app.config.get('VIDEO_FRAME_SKIP', 5),
-            type=int
-        )
-
-        # Process video
-        obj_svc = get_object_service()
-        if not obj_svc.is_available():
-            return ResponseHandler.error('Object detection service not available', 503)
-
-        result = obj_svc.detect_objects_in_video(filepath, frame_skip=frame_skip)
-
-        if result['success']:
-            return ResponseHandler.success(result)
-        else:
-            return ResponseHandler.error(result.get('error', 'Detection failed'), 500)
-
-    except Exception as e:
-        logger.error(f"Error in object detection: {e}")
-        return ResponseHandler.error(str(e), 500)
-
-
-@api_bp.route('/uploads/<filename>', methods=['GET'])
-def download_file(filename):
-    """Serve uploaded or processed files"""
-    try:
-        return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
-    except Exception as e:
-        logger.error(f"Error serving file: {e}")
-        return ResponseHandler.error('File not found', 404)
+    return ResponseHandler.preformatted(
+        _HEALTH_TEMPLATE,
+        _JSON_BOOL[face_service.is_available()],
+        _JSON_BOOL[object_service.is_available()]
+    )
+
+
+def _detect(kind, media):
+    """
+    Shared handler for the detection endpoints
+
+    Images are processed in-process. Videos are queued on the Celery workers
+    when USE_TASK_QUEUE is set, and processed in-process otherwise.
+
+    Args:
+        kind: Detection kind, 'face' or 'object'
+        media: Upload type, 'image' or 'video'
+
+    Returns:
+        Flask response object
+    """
+    service, method, task_key = DISPATCH[kind, media]
+    if media == 'video':
+        try:
+            frame_skip = read_frame_skip()
+        except ValueError:
+            return ResponseHandler.error('frame_skip must be a positive integer', 400)
+
+    # Validate and save file
+    filepath, error = receive_upload(media)
+    if error:
+        return error
+
+    args = [filepath]
+    if media == 'video':
+        args.append(frame_skip)
+
+        # Videos are too long for a web worker - queue them when workers are deployed
+        tasks = get_celery_tasks()
+        if tasks:
+            return enqueue(kind, tasks[task_key], args)
+
+    # Process in-process
+    if not service.is_available():
+        return ResponseHandler.error(f'{_SERVICE_LABELS[kind]} service not available', 503)
+
+    result = getattr(service, method)(*args)
+
+    if result['success']:
+        return ResponseHandler.success(result)
+    else:
+        return ResponseHandler.error(result.get('error', 'Detection failed'), 500)
+
+
+for _kind, _media in DISPATCH:
+    api_bp.add_url_rule(
+        f'/detect/{_kind}/{_media}',
+        endpoint=f'detect_{_kind}_{_media}',
+        view_func=partial(_detect, _kind, _media),
+        methods=['POST']
+    )
+
+api_bp.add_url_rule('/task/<task_id>', view_func=get_task_status, methods=['GET'])
+api_bp.add_url_rule('/uploads/<filename>', view_func=download_file, methods=['GET'])
+api_bp.register_error_handler(Exception, handle_api_error)
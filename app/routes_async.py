@@ -2,10 +2,20 @@
 Flask routes for the Recognize application - Async version with Celery tasks
 """
 import logging
-
-from flask import Blueprint, current_app, render_template, request, send_from_directory
-
-from app.utils.file_handler import FileHandler
+from functools import partial
+
+from flask import Blueprint, render_template
+
+from app.routes_common import (
+    DISPATCH,
+    download_file,
+    enqueue,
+    get_celery_tasks,
+    get_task_status,
+    handle_api_error,
+    read_frame_skip,
+    receive_upload,
+)
 from app.utils.response_handler import ResponseHandler
 
 logger = logging.getLogger(__name__)
@@ -15,27 +25,6 @@ main_bp = Blueprint('main', __name__)
 api_bp = Blueprint('api', __name__)
 
 
-# Import Celery tasks (lazy import to avoid circular dependencies)
-def get_celery_tasks():
-    """Lazy import of Celery tasks"""
-    try:
-        from app.tasks import (
-            detect_faces_in_image_task,
-            detect_faces_in_video_task,
-            detect_objects_in_image_task,
-            detect_objects_in_video_task,
-        )
-        return {
-            'face_image': detect_faces_in_image_task,
-            'face_video': detect_faces_in_video_task,
-            'object_image': detect_objects_in_image_task,
-            'object_video': detect_objects_in_video_task
-        }
-    except ImportError:
-        logger.warning("Celery tasks not available - running in synchronous mode")
-        return None
-
-
 # Web Interface Routes
 @main_bp.route('/')
 def index():
@@ -70,292 +59,57 @@ def health_check():
     })
 
 
-@api_bp.route('/detect/face/image', methods=['POST'])
-def detect_face_image():
-    """Detect faces in an uploaded image - async with Celery"""
-    try:
-        # Validate and save file
-        if 'file' not in request.files:
-            return ResponseHandler.error('No file provided', 400)
-
-        file = request.files['file']
-        if file.filename == '':
-            return ResponseHandler.error('No file selected', 400)
-
-        # Validate file type
-        allowed_exts = current_app.config['ALLOWED_IMAGE_EXTENSIONS']
-        if not FileHandler.allowed_file(file.filename, allowed_exts):
-            return ResponseHandler.error(
-                f"Invalid file type. Allowed: {', '.join(allowed_exts)}",
-                400
-            )
-
-        # Save file
-        filepath = FileHandler.save_upload(file, current_app.config['UPLOAD_FOLDER'])
-
-        # Get Celery tasks
-        tasks = get_celery_tasks()
-
-        if tasks:
-            # Async mode - queue the task
-            task = tasks['face_image'].apply_async(args=[str(filepath)])
-
-            return ResponseHandler.success({
-                'task_id': task.id,
-                'status': 'queued',
-                'message': 'Face detection task queued. Use task_id to check status.'
-            }, status_code=202)
-        else:
-            # Fallback to synchronous mode
-            from app.services import FacialRecognitionService
-            service = FacialRecognitionService(
-                cascade_path=current_app.config.get('FACE_CASCADE_PATH'),
-                confidence_threshold=current_app.config.get('FACE_DETECTION_CONFIDENCE', 0.5)
-            )
-            result = service.detect_faces_in_image(filepath)
-
-            if result['success']:
-                return ResponseHandler.success(result)
-            else:
-                return ResponseHandler.error(result.get('error', 'Detection failed'), 500)
-
-    except Exception as e:
-        logger.error(f"Error in face detection: {e}")
-        return ResponseHandler.error(str(e), 500)
-
-
-@api_bp.route('/detect/face/video', methods=['POST'])
-def detect_face_video():
-    """Detect faces in an uploaded video - async with Celery"""
-    try:
-        # Validate and save file
-        if 'file' not in request.files:
-            return ResponseHandler.error('No file provided', 400)
-
-        file = request.files['file']
-        if file.filename == '':
-            return ResponseHandler.error('No file selected', 400)
-
-        # Validate file type
-        allowed_exts = current_app.config['ALLOWED_VIDEO_EXTENSIONS']
-        if not FileHandler.allowed_file(file.filename, allowed_exts):
-            return ResponseHandler.error(
-                f"Invalid file type. Allowed: {', '.join(allowed_exts)}",
-                400
-            )
-
-        # Save file
-        filepath = FileHandler.save_upload(file, current_app.config['UPLOAD_FOLDER'])
-
-        # Get frame skip parameter
-        frame_skip = request.form.get(
-            'frame_skip',
-            current_app.config.get('VIDEO_FRAME_SKIP', 5),
-            type=int
-        )
-
-        # Get Celery tasks
-        tasks = get_celery_tasks()
-
-        if tasks:
-            # Async mode - queue the task
-            task = tasks['face_video'].apply_async(args=[str(filepath), frame_skip])
-
-            return ResponseHandler.success({
-                'task_id': task.id,
-                'status': 'queued',
-                'message': 'Face detection task queued. Use task_id to check status.'
-            }, status_code=202)
-        else:
-            # Fallback to synchronous mode
-            from app.services import FacialRecognitionService
-            service = FacialRecognitionService(
-                cascade_path=current_app.config.get('FACE_CASCADE_PATH'),
-                confidence_threshold=current_app.config.get('FACE_DETECTION_CONFIDENCE', 0.5)
-            )
-            result = service.detect_faces_in_video(filepath, frame_skip=frame_skip)
-
-            if result['success']:
-                return ResponseHandler.success(result)
-            else:
-                return ResponseHandler.error(result.get('error', 'Detection failed'), 500)
+def _detect(kind, media):
+    """
+    Shared handler for the detection endpoints - async with Celery
 
-    except Exception as e:
-        logger.error(f"Error in face detection: {e}")
-        return ResponseHandler.error(str(e), 500)
+    Args:
+        kind: Detection kind, 'face' or 'object'
+        media: Upload type, 'image' or 'video'
 
+    Returns:
+        Flask response object
+    """
+    service, method, task_key = DISPATCH[kind, media]
+    # Only videos take a frame skip parameter
+    extra_args = []
+    if media == 'video':
+        try:
+            extra_args.append(read_frame_skip())
+        except ValueError:
+            return ResponseHandler.error('frame_skip must be a positive integer', 400)
 
-@api_bp.route('/detect/object/image', methods=['POST'])
-def detect_object_image():
-    """Detect objects in an uploaded image - async with Celery"""
-    try:
-        # Validate and save file
-        if 'file' not in request.files:
-            return ResponseHandler.error('No file provided', 400)
+    # Validate and save file
+    filepath, error = receive_upload(media)
+    if error:
+        return error
 
-        file = request.files['file']
-        if file.filename == '':
-            return ResponseHandler.error('No file selected', 400)
+    args = [filepath, *extra_args]
 
-        # Validate file type
-        allowed_exts = current_app.config['ALLOWED_IMAGE_EXTENSIONS']
-        if not FileHandler.allowed_file(file.filename, allowed_exts):
-            return ResponseHandler.error(
-                f"Invalid file type. Allowed: {', '.join(allowed_exts)}",
-                400
-            )
-
-        # Save file
-        filepath = FileHandler.save_upload(file, current_app.config['UPLOAD_FOLDER'])
-
-        # Get Celery tasks
-        tasks = get_celery_tasks()
-
-        if tasks:
-            # Async mode - queue the task
-            task = tasks['object_image'].apply_async(args=[str(filepath)])
-
-            return ResponseHandler.success({
-                'task_id': task.id,
-                'status': 'queued',
-                'message': 'Object detection task queued. Use task_id to check status.'
-            }, status_code=202)
-        else:
-            # Fallback to synchronous mode
-            from app.services import ObjectDetectionService
-            service = ObjectDetectionService(
-                weights_path=current_app.config.get('YOLO_WEIGHTS_PATH'),
-                config_path=current_app.config.get('YOLO_CONFIG_PATH'),
-                names_path=current_app.config.get('YOLO_NAMES_PATH'),
-                confidence_threshold=current_app.config.get('OBJECT_DETECTION_CONFIDENCE', 0.5),
-                nms_threshold=current_app.config.get('NMS_THRESHOLD', 0.4)
-            )
-            result = service.detect_objects_in_image(filepath)
-
-            if result['success']:
-                return ResponseHandler.success(result)
-            else:
-                return ResponseHandler.error(result.get('error', 'Detection failed'), 500)
-
-    except Exception as e:
-        logger.error(f"Error in object detection: {e}")
-        return ResponseHandler.error(str(e), 500)
-
-
-@api_bp.route('/detect/object/video', methods=['POST'])
-def detect_object_video():
-    """Detect objects in an uploaded video - async with Celery"""
-    try:
-        # Validate and save file
-        if 'file' not in request.files:
-            return ResponseHandler.error('No file provided', 400)
-
-        file = request.files['file']
-        if file.filename == '':
-            return ResponseHandler.error('No file selected', 400)
-
-        # Validate file type
-        allowed_exts = current_app.config['ALLOWED_VIDEO_EXTENSIONS']
-        if not FileHandler.allowed_file(file.filename, allowed_exts):
-            return ResponseHandler.error(
-                f"Invalid file type. Allowed: {', '.join(allowed_exts)}",
-                400
-            )
-
-        # Save file
-        filepath = FileHandler.save_upload(file, current_app.config['UPLOAD_FOLDER'])
-
-        # Get frame skip parameter
-        frame_skip = request.form.get(
-            'frame_skip',
-            current_app.config.get('VIDEO_FRAME_SKIP', 5),
-            type=int
-        )
-
-        # Get Celery tasks
-        tasks = get_celery_tasks()
-
-        if tasks:
-            # Async mode - queue the task
-            task = tasks['object_video'].apply_async(args=[str(filepath), frame_skip])
-
-            return ResponseHandler.success({
-                'task_id': task.id,
-                'status': 'queued',
-                'message': 'Object detection task queued. Use task_id to check status.'
-            }, status_code=202)
-        else:
-            # Fallback to synchronous mode
-            from app.services import ObjectDetectionService
-            service = ObjectDetectionService(
-                weights_path=current_app.config.get('YOLO_WEIGHTS_PATH'),
-                config_path=current_app.config.get('YOLO_CONFIG_PATH'),
-                names_path=current_app.config.get('YOLO_NAMES_PATH'),
-                confidence_threshold=current_app.config.get('OBJECT_DETECTION_CONFIDENCE', 0.5),
-                nms_threshold=current_app.config.get('NMS_THRESHOLD', 0.4)
-            )
-            result = service.detect_objects_in_video(filepath, frame_skip=frame_skip)
-
-            if result['success']:
-                return ResponseHandler.success(result)
-            else:
-                return ResponseHandler.error(result.get('error', 'Detection failed'), 500)
-
-    except Exception as e:
-        logger.error(f"Error in object detection: {e}")
-        return ResponseHandler.error(str(e), 500)
-
-
-@api_bp.route('/task/<task_id>', methods=['GET'])
-def get_task_status(task_id):
-    """Get the status of a Celery task"""
-    try:
-        from celery.result import AsyncResult
-
-        from app.celery_app import celery_app
+    # Get Celery tasks
+    tasks = get_celery_tasks()
 
-        task = AsyncResult(task_id, app=celery_app)
+    if tasks:
+        # Async mode - queue the task
+        return enqueue(kind, tasks[task_key], args)
+    else:
+        # Fallback to synchronous mode
+        result = getattr(service, method)(*args)
 
-        if task.state == 'PENDING':
-            response = {
-                'state': task.state,
-                'status': 'Task is waiting in queue...'
-            }
-        elif task.state == 'PROCESSING':
-            response = {
-                'state': task.state,
-                'status': task.info.get('status', 'Processing...') if isinstance(task.info, dict) else 'Processing...'
-            }
-        elif task.state == 'SUCCESS':
-            response = {
-                'state': task.state,
-                'result': task.result
-            }
-        elif task.state == 'FAILURE':
-            response = {
-                'state': task.state,
-                'status': str(task.info)
-            }
+        if result['success']:
+            return ResponseHandler.success(result)
         else:
-            response = {
-                'state': task.state,
-                'status': 'Unknown state'
-            }
-
-        return ResponseHandler.success(response)
+            return ResponseHandler.error(result.get('error', 'Detection failed'), 500)
 
-    except ImportError:
-        return ResponseHandler.error('Task queue not available', 503)
-    except Exception as e:
-        logger.error(f"Error checking task status: {e}")
-        return ResponseHandler.error(str(e), 500)
 
+for _kind, _media in DISPATCH:
+    api_bp.add_url_rule(
+        f'/detect/{_kind}/{_media}',
+        endpoint=f'detect_{_kind}_{_media}',
+        view_func=partial(_detect, _kind, _media),
+        methods=['POST']
+    )
 
-@api_bp.route('/uploads/<filename>', methods=['GET'])
-def download_file(filename):
-    """Serve uploaded or processed files"""
-    try:
-        return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
-    except Exception as e:
-        logger.error(f"Error serving file: {e}")
-        return ResponseHandler.error('File not found', 404)
+api_bp.add_url_rule('/task/<task_id>', view_func=get_task_status, methods=['GET'])
+api_bp.add_url_rule('/uploads/<filename>', view_func=download_file, methods=['GET'])
+api_bp.register_error_handler(Exception, handle_api_error)
@@ -0,0 +1,353 @@
+"""
+Request handling shared by the synchronous and async route modules
+Upload validation, task queueing, task status and file downloads, plus the
+settings they read, snapshotted from the app config by configure().
+"""
+import json
+import logging
+import mimetypes
+from urllib.parse import quote
+
+from flask import Response, current_app, request, send_from_directory, url_for
+from werkzeug.exceptions import HTTPException, NotFound
+from werkzeug.security import safe_join
+
+from app.services._singletons import face_service, object_service
+from app.utils.file_handler import FileHandler
+from app.utils.progress import TaskProgress
+from app.utils.response_handler import ResponseHandler
+
+try:
+    from celery.result import AsyncResult as _AsyncResult
+    from celery.states import READY_STATES
+    from kombu.exceptions import OperationalError
+
+    from app.celery_app import celery_app
+
+    # Redis broker errors surface as OperationalError; the Redis result backend raises
+    # RuntimeError when it cannot subscribe to the task's result channel
+    _PUBLISH_ERRORS = (OperationalError, RuntimeError)
+except ImportError:
+    _AsyncResult = None
+    celery_app = None
+    _PUBLISH_ERRORS = ()
+
+logger = logging.getLogger(__name__)
+# Endpoint dispatch table: (kind, media) -> (service, detection method, Celery task key)
+DISPATCH = {
+    ('face', 'image'): (face_service, 'detect_faces_in_image', 'face_image'),
+    ('face', 'video'): (face_service, 'detect_faces_in_video', 'face_video'),
+    ('object', 'image'): (object_service, 'detect_objects_in_image', 'object_image'),
+    ('object', 'video'): (object_service, 'detect_objects_in_video', 'object_video'),
+}
+
+# Names used in responses: kind -> task name
+_LABELS = {
+    'face': 'Face detection',
+    'object': 'Object detection',
+}
+
+# Pre-serialized queued-task bodies, see ResponseHandler.preformatted
+_QUEUED_TEMPLATES = {
+    kind: (
+        b'{"success":true,"message":"Success","timestamp":"%%s","data":{"task_id":"%%s",'
+        b'"status":"queued","message":"%s task queued. Use task_id to check status."}}'
+        % label.encode()
+    )
+    for kind, label in _LABELS.items()
+}
+
+# Invariant settings, snapshotted from the app config by configure()
+_UPLOAD_FOLDER = None
+_X_ACCEL_PREFIX = ''
+_UPLOAD_RULES = {}
+_DEFAULT_FRAME_SKIP = 5
+_USE_TASK_QUEUE = False
+_DROP_UPLOAD_CACHE = False
+
+
+def configure(app):
+    """
+    Snapshot invariant settings from the application config
+
+    Called once from create_app so request handlers read module constants
+    instead of looking them up through current_app.config on every request.
+
+    Args:
+        app: Flask application instance
+    """
+    global _UPLOAD_FOLDER, _X_ACCEL_PREFIX, _UPLOAD_RULES, _DEFAULT_FRAME_SKIP, _USE_TASK_QUEUE, \
+        _DROP_UPLOAD_CACHE
+
+    allowed_img = sorted(app.config['ALLOWED_IMAGE_EXTENSIONS'])
+    allowed_vid = sorted(app.config['ALLOWED_VIDEO_EXTENSIONS'])
+
+    _UPLOAD_FOLDER = app.config['UPLOAD_FOLDER']
+    _X_ACCEL_PREFIX = app.config.get('X_ACCEL_REDIRECT_PREFIX', '')
+    _UPLOAD_RULES = {
+        'image': (
+            FileHandler.extension_pattern(allowed_img),
+            f"Invalid file type. Allowed: {', '.join(allowed_img)}"
+        ),
+        'video': (
+            FileHandler.extension_pattern(allowed_vid),
+            f"Invalid file type. Allowed: {', '.join(allowed_vid)}"
+        ),
+    }
+    _DEFAULT_FRAME_SKIP = app.config.get('VIDEO_FRAME_SKIP', 5)
+    _USE_TASK_QUEUE = app.config.get('USE_TASK_QUEUE', False)
+    # Only queued videos are read by another process, possibly on another host
+    _DROP_UPLOAD_CACHE = _USE_TASK_QUEUE and app.config.get('UPLOAD_DROP_PAGE_CACHE', False)
+
+
+# Import Celery tasks (lazy import to avoid circular dependencies)
+def get_celery_tasks():
+    """
+    Lazy import of Celery tasks
+
+    Returns:
+        dict: Tasks by key, or None when USE_TASK_QUEUE is off or Celery is missing
+    """
+    if not _USE_TASK_QUEUE:
+        return None
+
+    try:
+        from app.tasks import (
+            detect_faces_in_image_task,
+            detect_faces_in_video_task,
+            detect_objects_in_image_task,
+            detect_objects_in_video_task,
+        )
+        return {
+            'face_image': detect_faces_in_image_task,
+            'face_video': detect_faces_in_video_task,
+            'object_image': detect_objects_in_image_task,
+            'object_video': detect_objects_in_video_task
+        }
+    except ImportError:
+        logger.warning("Celery tasks not available - running in synchronous mode")
+        return None
+
+
+def receive_upload(media):
+    """
+    Validate and save the file sent with the current request
+
+    Multipart requests carry the file in the ``file`` form field. Any other
+    body is treated as the raw file contents, named by the ``filename`` query
+    parameter, and streamed to disk without going through the form parser.
+
+    Args:
+        media: Upload type, 'image' or 'video'
+
+    Returns:
+        tuple: (filepath, None) on success, (None, error response) otherwise
+    """
+    ext_pattern, invalid_msg = _UPLOAD_RULES[media]
+    if request.mimetype.startswith('multipart/'):
+        if 'file' not in request.files:
+            return None, ResponseHandler.error('No file provided', 400)
+        file = request.files['file']
+        filename = file.filename
+    else:
+        file = None
+        filename = request.args.get('filename')
+        if filename is None or request.content_length == 0:
+            return None, ResponseHandler.error('No file provided', 400)
+
+    if filename == '':
+        return None, ResponseHandler.error('No file selected', 400)
+
+    # Validate file type
+    if not ext_pattern.search(filename):
+        return None, ResponseHandler.error(invalid_msg, 400)
+
+    # Save file
+    drop_cache = _DROP_UPLOAD_CACHE and media == 'video'
+    if file is not None:
+        return FileHandler.save_upload(file, _UPLOAD_FOLDER, drop_cache=drop_cache), None
+    return FileHandler.stream_upload_to_disk(
+        request.stream, filename, _UPLOAD_FOLDER, drop_cache=drop_cache
+    ), None
+
+
+def enqueue(kind, task, args):
+    """
+    Queue a detection task and build the 202 response for it
+
+    Args:
+        kind: Detection kind, 'face' or 'object'
+        task: Celery task to queue
+        args: Task arguments; the first is the uploaded file's path
+
+    Returns:
+        Flask response object, with a Location header for the task status,
+        or a 503 error if the broker cannot be reached
+    """
+    try:
+        task = task.apply_async(args=args)
+    except _PUBLISH_ERRORS as e:
+        logger.error("Could not queue %s task: %s", kind, e)
+        FileHandler.cleanup_file(args[0])
+        return ResponseHandler.error('Task queue not available', 503)
+
+    response, status_code = ResponseHandler.preformatted(
+        _QUEUED_TEMPLATES[kind], task.id.encode(), status_code=202
+    )
+    response.headers['Location'] = url_for('.get_task_status', task_id=task.id)
+    return response, status_code
+
+
+def read_frame_skip():
+    """
+    Read the frame skip for a video request
+
+    Taken from the query string so raw body uploads never run the form
+    parser; multipart requests may still send it as a form field.
+
+    Returns:
+        int: Process every Nth frame
+
+    Raises:
+        ValueError: If the value is not a positive integer
+    """
+    value = request.args.get('frame_skip')
+    if value is None and request.mimetype.startswith('multipart/'):
+        value = request.form.get('frame_skip')
+    frame_skip = int(value) if value else _DEFAULT_FRAME_SKIP
+    if frame_skip < 1:
+        raise ValueError(frame_skip)
+    return frame_skip
+
+
+def handle_api_error(e):
+    """
+    Turn exceptions raised by the API views into JSON error responses
+
+    The single catch-all for the API, so views need no try/except of their
+    own. HTTP errors keep their status code; anything else is a 500.
+    """
+    if isinstance(e, HTTPException):
+        return ResponseHandler.error(e.description, e.code)
+
+    if current_app.debug:
+        logger.exception("Error in %s", request.endpoint)
+    else:
+        logger.error("%s in %s: %s", e.__class__.__name__, request.endpoint, e)
+    return ResponseHandler.error(str(e), 500)
+
+
+def _started_status(task):
+    """Report the latest progress message a running task published, if any"""
+    return TaskProgress.latest(task.id) or {'status': 'Task has started...'}
+
+
+# Task state -> extra fields for the status response
+_STATE_HANDLERS = {
+    'PENDING': lambda task: {'status': 'Task is waiting in queue...'},
+    'STARTED': _started_status,
+    'SUCCESS': lambda task: {'result': task.result},
+    'FAILURE': lambda task: {'status': str(task.info)},
+}
+
+# Seconds between keep-alive comments on an idle status stream
+_SSE_KEEPALIVE = 15
+
+
+def _unknown_state(task):
+    """Status fields for states without a dedicated handler"""
+    return {'status': 'Unknown state'}
+
+
+def _task_status(task_id):
+    """
+    Look up a task's state and the fields describing it
+
+    Args:
+        task_id: Celery task ID
+
+    Returns:
+        dict: Status response data
+    """
+    task = _AsyncResult(task_id, app=celery_app)
+
+    # Each access to task.state queries the result backend - read it once
+    state = task.state
+    response = {'state': state}
+    response.update(_STATE_HANDLERS.get(state, _unknown_state)(task))
+    return response
+
+
+def _stream_task_status(task_id, pubsub):
+    """
+    Yield Server-Sent Events for a task until it finishes
+
+    Args:
+        task_id: Celery task ID
+        pubsub: Subscription to the task's progress and result channels
+
+    Yields:
+        str: SSE frames
+    """
+    progress_channel = TaskProgress.channel(task_id).encode()
+    try:
+        # Already subscribed, so no transition after this lookup can be missed
+        status = _task_status(task_id)
+        yield f"data: {json.dumps(status)}\n\n"
+
+        while status['state'] not in READY_STATES:
+            message = pubsub.get_message(timeout=_SSE_KEEPALIVE)
+            if message is None:
+                yield ': keep-alive\n\n'
+                continue
+
+            if message['channel'] == progress_channel:
+                status = json.loads(message['data'])
+            else:
+                # The result backend publishes on the result key when the task finishes
+                status = _task_status(task_id)
+            yield f"data: {json.dumps(status)}\n\n"
+    finally:
+        pubsub.close()
+
+
+def get_task_status(task_id):
+    """
+    Get the status of a Celery task
+
+    Clients sending ``Accept: text/event-stream`` get a Server-Sent Events
+    stream that pushes each progress update instead of having to poll.
+    """
+    if _AsyncResult is None:
+        return ResponseHandler.error('Task queue not available', 503)
+
+    # Streaming needs a key-value result backend (Redis) that publishes on the result key
+    backend = celery_app.backend
+    if request.accept_mimetypes.best == 'text/event-stream' and hasattr(backend, 'get_key_for_task'):
+        pubsub = TaskProgress.subscribe(task_id, backend.get_key_for_task(task_id))
+        if pubsub is not None:
+            return Response(
+                _stream_task_status(task_id, pubsub),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+
+    return ResponseHandler.success(_task_status(task_id))
+
+
+def download_file(filename):
+    """Serve uploaded or processed files"""
+    try:
+        if _X_ACCEL_PREFIX:
+            # Let nginx stream the file from its internal location
+            if safe_join(_UPLOAD_FOLDER, filename) is None:
+                return ResponseHandler.error('File not found', 404)
+            return Response(
+                headers={'X-Accel-Redirect': _X_ACCEL_PREFIX + quote(filename)},
+                mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            )
+
+        # Honours USE_X_SENDFILE; conditional requests short-circuit with 304/206
+        return send_from_directory(_UPLOAD_FOLDER, filename, conditional=True)
+    except NotFound:
+        return ResponseHandler.error('File not found', 404)
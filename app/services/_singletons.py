@@ -0,0 +1,10 @@
+"""
+Shared recognition service instances
+The services are created once per process by create_app and stored in
+app.extensions; these proxies resolve them for the current application.
+"""
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+face_service = LocalProxy(lambda: current_app.extensions['face_service'])
+object_service = LocalProxy(lambda: current_app.extensions['object_service'])
@@ -3,9 +3,13 @@ Facial Recognition Service
 Handles face detection and recognition in images and videos
 """
 import logging
+import threading
 from pathlib import Path
 
 import cv2
+import numpy as np
+
+from app.utils.video_io import VideoIO
 
 logger = logging.getLogger(__name__)
 
@@ -13,16 +17,43 @@ logger = logging.getLogger(__name__)
 class FacialRecognitionService:
     """Service for detecting and recognizing faces in images and videos"""
 
-    def __init__(self, cascade_path=None, confidence_threshold=0.5):
+    # Longest edge the Haar cascade runs at; its cost grows with pixel count
+    MAX_CASCADE_EDGE = 960
+
+    # Smallest face the cascade reports, in original image pixels
+    MIN_FACE_SIZE = 30
+
+    def __init__(self, cascade_path=None, confidence_threshold=0.5, model_path=None,
+                 annotate_video=True):
         """
         Initialize the facial recognition service
 
         Args:
             cascade_path: Path to Haar Cascade XML file
             confidence_threshold: Minimum confidence for face detection
+            model_path: Path to a YuNet ONNX model; used instead of the cascade when present
+            annotate_video: Render detections into an annotated copy of each video; when
+                False they are written to a JSON sidecar and the video is not re-encoded
         """
         self.confidence_threshold = confidence_threshold
+        self.annotate_video = annotate_video
         self.face_cascade = None
+        self.face_detector = None
+        self._detector_size = None
+        # Neither detector is thread-safe, and gthread workers share the service
+        # between request threads
+        self._detector_lock = threading.Lock()
+
+        if model_path and Path(model_path).exists():
+            # YuNet (libfacedetection's CNN) - faster than the Haar cascade and gives scores
+            try:
+                self.face_detector = cv2.FaceDetectorYN.create(
+                    str(model_path), '', (320, 320), score_threshold=confidence_threshold
+                )
+                logger.info(f"Loaded YuNet face detector from {model_path}")
+                return
+            except cv2.error as e:
+                logger.error(f"Failed to load YuNet face detector, using Haar cascade: {e}")
 
         if cascade_path and Path(cascade_path).exists():
             self.face_cascade = cv2.CascadeClassifier(cascade_path)
@@ -37,6 +68,49 @@ class FacialRecognitionService:
             except Exception as e:
                 logger.error(f"Failed to load face cascade: {e}")
 
+    def _detect(self, image):
+        """
+        Find faces in a BGR image
+
+        Args:
+            image: Image as a numpy array
+
+        Returns:
+            list: (x, y, w, h, confidence) for each face
+        """
+        if self.face_detector is not None:
+            size = (image.shape[1], image.shape[0])
+            with self._detector_lock:
+                if size != self._detector_size:
+                    self.face_detector.setInputSize(size)
+                    self._detector_size = size
+                _, faces = self.face_detector.detect(image)
+            if faces is None:
+                return []
+            return [(int(x), int(y), int(w), int(h), float(f[-1])) for x, y, w, h, *f in faces]
+
+        # Convert to grayscale for detection
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        # Detect on a downscaled copy of large images and map the boxes back
+        scale = min(1.0, self.MAX_CASCADE_EDGE / max(gray.shape))
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        min_size = max(1, round(self.MIN_FACE_SIZE * scale))
+
+        with self._detector_lock:
+            faces = self.face_cascade.detectMultiScale(
+                gray,
+                scaleFactor=1.1,
+                minNeighbors=5,
+                minSize=(min_size, min_size)
+            )
+        # Haar cascades don't provide confidence scores
+        return [
+            (int(x / scale), int(y / scale), int(w / scale), int(h / scale), 1.0)
+            for x, y, w, h in faces
+        ]
+
     def detect_faces_in_image(self, image_path):
         """
         Detect faces in a single image
@@ -53,20 +127,12 @@ class FacialRecognitionService:
             if image is None:
                 raise ValueError(f"Could not read image: {image_path}")
 
-            # Convert to grayscale for detection
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
             # Detect faces
-            faces = self.face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(30, 30)
-            )
+            faces = self._detect(image)
 
             # Draw rectangles around faces
             face_data = []
-            for i, (x, y, w, h) in enumerate(faces):
+            for i, (x, y, w, h, confidence) in enumerate(faces):
                 cv2.rectangle(image, (x, y), (x+w, y+h), (0, 255, 0), 2)
                 cv2.putText(
                     image, f'Face {i+1}', (x, y-10),
@@ -75,8 +141,8 @@ class FacialRecognitionService:
 
                 face_data.append({
                     'face_id': i + 1,
-                    'bbox': {'x': int(x), 'y': int(y), 'width': int(w), 'height': int(h)},
-                    'confidence': 1.0  # Haar cascades don't provide confidence scores
+                    'bbox': {'x': x, 'y': y, 'width': w, 'height': h},
+                    'confidence': confidence
                 })
 
             # Save annotated image
@@ -111,7 +177,7 @@ class FacialRecognitionService:
             dict: Detection results with face counts per frame
         """
         try:
-            cap = cv2.VideoCapture(str(video_path))
+            cap = VideoIO.open_capture(video_path)
             if not cap.isOpened():
                 raise ValueError(f"Could not open video: {video_path}")
 
@@ -121,54 +187,59 @@ class FacialRecognitionService:
             height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
             total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
-            # Setup output video
+            # Setup output video; without one, detections go to a sidecar instead
             output_path = Path(video_path).parent / f"annotated_{Path(video_path).name}"
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
+            out = None
+            if self.annotate_video:
+                out = VideoIO.open_writer(output_path, fps, (width, height))
 
             frame_results = []
-            frame_count = 0
+            annotations = []
             total_faces = 0
 
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                # Process every Nth frame
-                if frame_count % frame_skip == 0:
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    faces = self.face_cascade.detectMultiScale(
-                        gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
-                    )
-
-                    # Draw rectangles
-                    for (x, y, w, h) in faces:
-                        cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-
-                    if len(faces) > 0:
-                        frame_results.append({
-                            'frame': frame_count,
-                            'timestamp': frame_count / fps,
-                            'faces_count': len(faces)
-                        })
-                        total_faces += len(faces)
-
-                out.write(frame)
-                frame_count += 1
+            # Decoding and encoding run on background threads, overlapping detection
+            with VideoIO.frame_writer(out) as write:
+                for frame_count, frame in enumerate(VideoIO.read_frames(cap)):
+                    # Process every Nth frame
+                    if frame_count % frame_skip == 0:
+                        faces = self._detect(frame)
+
+                        # Draw rectangles
+                        if out is not None:
+                            for x, y, w, h, _ in faces:
+                                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+
+                        if len(faces) > 0:
+                            frame_results.append({
+                                'frame': frame_count,
+                                'timestamp': frame_count / fps,
+                                'faces_count': len(faces)
+                            })
+                            annotations.append({
+                                'frame': frame_count,
+                                'timestamp': frame_count / fps,
+                                'faces': [[x, y, w, h] for x, y, w, h, _ in faces]
+                            })
+                            total_faces += len(faces)
+
+                    write(frame)
 
             cap.release()
-            out.release()
 
-            return {
+            result = {
                 'success': True,
                 'total_frames': total_frames,
                 'processed_frames': len(frame_results),
                 'total_faces_detected': total_faces,
                 'frames_with_faces': frame_results,
-                'annotated_video': str(output_path),
                 'original_video': str(video_path)
             }
+            if out is not None:
+                out.release()
+                result['annotated_video'] = str(output_path)
+            else:
+                result['annotations'] = str(VideoIO.write_annotations(video_path, annotations))
+            return result
 
         except Exception as e:
             logger.error(f"Error processing video: {e}")
@@ -179,4 +250,9 @@ class FacialRecognitionService:
 
     def is_available(self):
         """Check if the service is properly initialized"""
-        return self.face_cascade is not None
+        return self.face_detector is not None or self.face_cascade is not None
+
+    def warmup(self):
+        """Run detection once on a blank image so the first request doesn't pay setup costs"""
+        if self.is_available():
+            self._detect(np.zeros((320, 320, 3), dtype=np.uint8))
@@ -41,21 +41,28 @@ function setupFormHandler(formId, endpoint, fileInputId, frameSkipId = null) {
         const formData = new FormData();
         formData.append('file', file);
 
+        // frame_skip goes in the query string so the server can skip form parsing
+        let url = endpoint;
         if (frameSkipId) {
             const frameSkip = document.getElementById(frameSkipId).value;
-            formData.append('frame_skip', frameSkip);
+            url += '?frame_skip=' + encodeURIComponent(frameSkip);
         }
 
         // Show progress
         showProgress();
 
         try {
-            const response = await fetch(endpoint, {
+            const response = await fetch(url, {
                 method: 'POST',
                 body: formData
             });
 
-            const result = await response.json();
+            let result = await response.json();
+
+            // Videos are queued - wait for the worker to finish
+            if (result.success && response.status === 202) {
+                result = await waitForTask(result.data.task_id);
+            }
 
             if (result.success) {
                 displayResults(result.data);
@@ -70,6 +77,24 @@ function setupFormHandler(formId, endpoint, fileInputId, frameSkipId = null) {
     });
 }
 
+async function waitForTask(taskId, interval = 2000) {
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, interval));
+
+        const response = await fetch(`/api/task/${taskId}`);
+        const status = await response.json();
+        if (!status.success) return status;
+
+        if (status.data.state === 'SUCCESS') {
+            const data = status.data.result;
+            return data.success ? { success: true, data } : { success: false, message: data.error };
+        }
+        if (status.data.state === 'FAILURE') {
+            return { success: false, message: status.data.status };
+        }
+    }
+}
+
 function showProgress() {
     const progress = document.getElementById('progress');
     const results = document.getElementById('results');
@@ -97,6 +122,13 @@ function displayResults(data) {
                     <source src="/api/uploads/${data.annotated_video.split('/').pop()}" type="video/mp4">
                     Your browser does not support the video tag.
                 </video>`;
+    } else if (data.annotations) {
+        // Detections were written to a sidecar instead of an annotated copy
+        html += `<video controls style="max-width: 100%;">
+                    <source src="/api/uploads/${data.original_video.split('/').pop()}">
+                    Your browser does not support the video tag.
+                </video>
+                <p><a href="/api/uploads/${data.annotations.split('/').pop()}">Download annotations</a></p>`;
     }
 
     // Display detection info
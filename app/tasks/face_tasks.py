@@ -7,9 +7,27 @@ import logging
 from app.celery_app import celery_app
 from app.config import Config
 from app.services import FacialRecognitionService
+from app.utils.progress import TaskProgress
 
 logger = logging.getLogger(__name__)
 
+# Built on first use and reused for the life of the worker process, so the
+# model is loaded from disk once rather than on every task
+_service = None
+
+
+def _get_service():
+    """Get the worker's shared FacialRecognitionService, creating it on first use"""
+    global _service
+    if _service is None:
+        _service = FacialRecognitionService(
+            cascade_path=Config.FACE_CASCADE_PATH,
+            confidence_threshold=Config.FACE_DETECTION_CONFIDENCE,
+            model_path=Config.FACE_DETECTOR_MODEL_PATH,
+            annotate_video=Config.ANNOTATE_VIDEO
+        )
+    return _service
+
 
 @celery_app.task(bind=True, name='app.tasks.face_tasks.detect_faces_in_image')
 def detect_faces_in_image_task(self, image_path):
@@ -23,17 +41,10 @@ def detect_faces_in_image_task(self, image_path):
         dict: Detection results
     """
     try:
-        # Update task state
-        self.update_state(state='PROCESSING', meta={'status': 'Initializing face detection service'})
+        service = _get_service()
 
-        # Initialize service
-        service = FacialRecognitionService(
-            cascade_path=Config.FACE_CASCADE_PATH,
-            confidence_threshold=Config.FACE_DETECTION_CONFIDENCE
-        )
-
-        # Update state
-        self.update_state(state='PROCESSING', meta={'status': 'Detecting faces in image'})
+        # Report progress
+        TaskProgress.publish(self.request.id, 'Detecting faces in image')
 
         # Process image
         result = service.detect_faces_in_image(image_path)
@@ -64,17 +75,10 @@ def detect_faces_in_video_task(self, video_path, frame_skip=5):
         dict: Detection results
     """
     try:
-        # Update task state
-        self.update_state(state='PROCESSING', meta={'status': 'Initializing face detection service'})
-
-        # Initialize service
-        service = FacialRecognitionService(
-            cascade_path=Config.FACE_CASCADE_PATH,
-            confidence_threshold=Config.FACE_DETECTION_CONFIDENCE
-        )
+        service = _get_service()
 
-        # Update state
-        self.update_state(state='PROCESSING', meta={'status': 'Processing video frames'})
+        # Report progress
+        TaskProgress.publish(self.request.id, 'Processing video frames')
 
         # Process video
         result = service.detect_faces_in_video(video_path, frame_skip=frame_skip)
@@ -7,9 +7,32 @@ import logging
 from app.celery_app import celery_app
 from app.config import Config
 from app.services import ObjectDetectionService
+from app.utils.progress import TaskProgress
 
 logger = logging.getLogger(__name__)
 
+# Built on first use and reused for the life of the worker process, so the
+# model is loaded from disk once rather than on every task
+_service = None
+
+
+def _get_service():
+    """Get the worker's shared ObjectDetectionService, creating it on first use"""
+    global _service
+    if _service is None:
+        _service = ObjectDetectionService(
+            weights_path=Config.YOLO_WEIGHTS_PATH,
+            config_path=Config.YOLO_CONFIG_PATH,
+            names_path=Config.YOLO_NAMES_PATH,
+            confidence_threshold=Config.OBJECT_DETECTION_CONFIDENCE,
+            nms_threshold=Config.NMS_THRESHOLD,
+            use_cuda=Config.YOLO_USE_CUDA,
+            batch_size=Config.YOLO_BATCH_SIZE,
+            annotate_video=Config.ANNOTATE_VIDEO,
+            model_format=Config.YOLO_MODEL_FORMAT
+        )
+    return _service
+
 
 @celery_app.task(bind=True, name='app.tasks.object_tasks.detect_objects_in_image')
 def detect_objects_in_image_task(self, image_path):
@@ -23,20 +46,10 @@ def detect_objects_in_image_task(self, image_path):
         dict: Detection results
     """
     try:
-        # Update task state
-        self.update_state(state='PROCESSING', meta={'status': 'Initializing object detection service'})
-
-        # Initialize service
-        service = ObjectDetectionService(
-            weights_path=Config.YOLO_WEIGHTS_PATH,
-            config_path=Config.YOLO_CONFIG_PATH,
-            names_path=Config.YOLO_NAMES_PATH,
-            confidence_threshold=Config.OBJECT_DETECTION_CONFIDENCE,
-            nms_threshold=Config.NMS_THRESHOLD
-        )
+        service = _get_service()
 
-        # Update state
-        self.update_state(state='PROCESSING', meta={'status': 'Detecting objects in image'})
+        # Report progress
+        TaskProgress.publish(self.request.id, 'Detecting objects in image')
 
         # Process image
         result = service.detect_objects_in_image(image_path)
@@ -67,20 +80,10 @@ def detect_objects_in_video_task(self, video_path, frame_skip=5):
         dict: Detection results
     """
     try:
-        # Update task state
-        self.update_state(state='PROCESSING', meta={'status': 'Initializing object detection service'})
-
-        # Initialize service
-        service = ObjectDetectionService(
-            weights_path=Config.YOLO_WEIGHTS_PATH,
-            config_path=Config.YOLO_CONFIG_PATH,
-            names_path=Config.YOLO_NAMES_PATH,
-            confidence_threshold=Config.OBJECT_DETECTION_CONFIDENCE,
-            nms_threshold=Config.NMS_THRESHOLD
-        )
+        service = _get_service()
 
-        # Update state
-        self.update_state(state='PROCESSING', meta={'status': 'Processing video frames'})
+        # Report progress
+        TaskProgress.publish(self.request.id, 'Processing video frames')
 
         # Process video
         result = service.detect_objects_in_video(video_path, frame_skip=frame_skip)
@@ -2,6 +2,9 @@
 Utility modules package
 """
 from .file_handler import FileHandler
+from .json_provider import OrjsonProvider
+from .progress import TaskProgress
 from .response_handler import ResponseHandler
+from .video_io import VideoIO
 
-__all__ = ['FileHandler', 'ResponseHandler']
+__all__ = ['FileHandler', 'OrjsonProvider', 'ResponseHandler', 'TaskProgress', 'VideoIO']
@@ -0,0 +1,75 @@
+"""
+Fast JSON serialization for Flask responses
+Uses orjson when it is installed, falling back to Flask's standard provider.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that serializes with orjson, matching Flask's output"""
+
+    if orjson is not None:
+        # str() of non-string keys as Flask does; datetimes go through
+        # default() so they keep Flask's HTTP date format
+        OPTIONS = (
+            orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+
+    def dumps(self, obj, **kwargs):
+        """
+        Serialize data as JSON
+
+        Args:
+            obj: The data to serialize
+            kwargs: Options for json.dumps; any given uses the standard provider
+
+        Returns:
+            str: JSON text
+        """
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._orjson_dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        """
+        Deserialize data as JSON
+
+        Args:
+            s: Text or UTF-8 bytes
+            kwargs: Options for json.loads; any given uses the standard provider
+
+        Returns:
+            The deserialized data
+        """
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """
+        Serialize data as JSON and wrap it in a response
+
+        Writes the orjson bytes straight into the response instead of
+        decoding them to a string first. Pretty-printed output (debug mode,
+        or compact set to False) is left to Flask.
+
+        Returns:
+            Flask response object
+        """
+        if orjson is None or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            self._orjson_dumps(obj, orjson.OPT_APPEND_NEWLINE), mimetype=self.mimetype
+        )
+
+    def _orjson_dumps(self, obj, option=0):
+        """Serialize with orjson using the provider's settings"""
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option | self.OPTIONS)
@@ -0,0 +1,119 @@
+"""
+Task progress messages over Redis
+Workers publish progress while a task runs; the web app reads the latest
+message when polled or streams messages to clients as they arrive.
+"""
+import json
+import logging
+
+from app.config import Config
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class TaskProgress:
+    """Utility class for publishing and reading task progress"""
+
+    # Seconds a progress message is kept after its last update
+    TTL = 3600
+
+    _client = None
+
+    @staticmethod
+    def channel(task_id):
+        """
+        Get the Redis key and pub/sub channel for a task's progress
+
+        Args:
+            task_id: Celery task ID
+
+        Returns:
+            str: Channel name
+        """
+        return f'task:{task_id}:progress'
+
+    @classmethod
+    def client(cls):
+        """
+        Get the shared Redis client
+
+        Returns:
+            redis.Redis: Client, or None if the redis package is not installed
+
+        Raises:
+            ValueError: If CELERY_RESULT_BACKEND is not a Redis URL
+        """
+        if cls._client is None and redis is not None:
+            cls._client = redis.Redis.from_url(Config.CELERY_RESULT_BACKEND)
+        return cls._client
+
+    @classmethod
+    def publish(cls, task_id, status):
+        """
+        Record and broadcast a progress message for a task
+
+        Failures are logged and swallowed so progress reporting never fails a task.
+
+        Args:
+            task_id: Celery task ID
+            status: Human-readable progress message
+        """
+        if redis is None:
+            return
+
+        key = cls.channel(task_id)
+        message = json.dumps({'state': 'PROCESSING', 'status': status})
+        try:
+            cls.client().pipeline().setex(key, cls.TTL, message).publish(key, message).execute()
+        except (redis.RedisError, ValueError) as e:
+            # ValueError: CELERY_RESULT_BACKEND is not a Redis URL
+            logger.warning(f"Could not publish progress for task {task_id}: {e}")
+
+    @classmethod
+    def latest(cls, task_id):
+        """
+        Get the most recent progress message for a task
+
+        Args:
+            task_id: Celery task ID
+
+        Returns:
+            dict: Progress message, or None if there is none or Redis is unreachable
+        """
+        if redis is None:
+            return None
+
+        try:
+            message = cls.client().get(cls.channel(task_id))
+        except (redis.RedisError, ValueError) as e:
+            logger.warning(f"Could not read progress for task {task_id}: {e}")
+            return None
+        return json.loads(message) if message else None
+
+    @classmethod
+    def subscribe(cls, task_id, *extra_channels):
+        """
+        Subscribe to a task's progress channel
+
+        Args:
+            task_id: Celery task ID
+            extra_channels: Additional channels to listen on
+
+        Returns:
+            redis.client.PubSub: Subscription, or None if Redis is missing or unreachable
+        """
+        if redis is None:
+            return None
+
+        try:
+            pubsub = cls.client().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(cls.channel(task_id), *extra_channels)
+        except (redis.RedisError, ValueError) as e:
+            logger.warning(f"Could not subscribe to progress for task {task_id}: {e}")
+            return None
+        return pubsub
@@ -3,7 +3,7 @@ Response handling utilities for consistent API responses
 """
 from datetime import datetime
 
-from flask import jsonify
+from flask import Response, jsonify
 
 
 class ResponseHandler:
@@ -33,6 +33,27 @@ class ResponseHandler:
 
         return jsonify(response), status_code
 
+    @staticmethod
+    def preformatted(template, *values, status_code=200):
+        """
+        Create a success response from a pre-serialized JSON template
+
+        For fixed-schema hot paths: fills a byte template instead of building
+        and serializing a dict on every request. The template's first ``%s``
+        receives the timestamp; the remaining values are inserted as given and
+        must already be valid JSON fragments.
+
+        Args:
+            template: Bytes JSON document with ``%s`` placeholders
+            values: Bytes for the placeholders after the timestamp
+            status_code: HTTP status code
+
+        Returns:
+            Flask response object
+        """
+        payload = template % (datetime.utcnow().isoformat().encode(), *values)
+        return Response(payload, mimetype='application/json'), status_code
+
     @staticmethod
     def error(message='An error occurred', status_code=400, error_code=None):
         """
@@ -0,0 +1,190 @@
+"""
+Video reading and writing
+Opens captures and writers with hardware-accelerated decode/encode where
+the OpenCV build and the host support it, falling back to software.
+"""
+import json
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a frame queue
+_END = object()
+
+
+def _put(frames, item, stop):
+    """Put item on a bounded queue, giving up once stop is set"""
+    while not stop.is_set():
+        try:
+            frames.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+class VideoIO:
+    """Utility class for opening video captures and writers"""
+
+    # OpenCV 4.5.2+ accepts acceleration params; older builds only decode in software
+    HW_ACCELERATION = hasattr(cv2, 'CAP_PROP_HW_ACCELERATION')
+
+    # Codecs tried for written videos, best first. H.264 is far cheaper to encode
+    # than MPEG-4 Part 2 on NVENC/VAAPI, but needs an FFmpeg build with an encoder
+    FOURCCS = ('avc1', 'mp4v')
+
+    # Codecs that failed to open, skipped for the rest of the process
+    _unavailable_fourccs = set()
+
+    @staticmethod
+    def open_capture(video_path):
+        """
+        Open a video for reading, using hardware decode (VAAPI/NVDEC/...) when available
+
+        Args:
+            video_path: Path to the video file
+
+        Returns:
+            cv2.VideoCapture: The capture; check isOpened()
+        """
+        if VideoIO.HW_ACCELERATION:
+            cap = cv2.VideoCapture(str(video_path), cv2.CAP_FFMPEG, [
+                cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY,
+            ])
+            if cap.isOpened():
+                return cap
+            logger.debug(f"FFmpeg capture failed for {video_path}, using default backend")
+        return cv2.VideoCapture(str(video_path))
+
+    @staticmethod
+    def open_writer(output_path, fps, size):
+        """
+        Open a video for writing, using hardware encode when available
+
+        Writes H.264 when the FFmpeg build has an encoder for it, else MPEG-4.
+
+        Args:
+            output_path: Path of the video to write
+            fps: Frame rate
+            size: (width, height) of the frames
+
+        Returns:
+            cv2.VideoWriter: The writer
+        """
+        if VideoIO.HW_ACCELERATION:
+            for codec in VideoIO.FOURCCS:
+                if codec in VideoIO._unavailable_fourccs:
+                    continue
+                fourcc = cv2.VideoWriter_fourcc(*codec)
+                out = cv2.VideoWriter(str(output_path), cv2.CAP_FFMPEG, fourcc, fps, size, [
+                    cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY,
+                ])
+                if out.isOpened():
+                    return out
+                logger.info(f"Video codec {codec} unavailable, trying the next one")
+                VideoIO._unavailable_fourccs.add(codec)
+        return cv2.VideoWriter(str(output_path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+
+    @staticmethod
+    def read_frames(cap, buffer_size=16):
+        """
+        Yield a capture's frames, decoding ahead on a background thread
+
+        OpenCV releases the GIL while decoding, so the next frames decode
+        while the caller runs inference on the current ones.
+
+        Args:
+            cap: An opened cv2.VideoCapture
+            buffer_size: Maximum number of decoded frames held ahead of the caller
+
+        Yields:
+            numpy.ndarray: Each frame in order
+        """
+        frames = queue.Queue(maxsize=buffer_size)
+        stop = threading.Event()
+        errors = []
+
+        def decode():
+            try:
+                while not stop.is_set():
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    _put(frames, frame, stop)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                _put(frames, _END, stop)
+
+        thread = threading.Thread(target=decode, name='video-decode', daemon=True)
+        thread.start()
+        try:
+            while (frame := frames.get()) is not _END:
+                yield frame
+        finally:
+            stop.set()
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    @staticmethod
+    @contextmanager
+    def frame_writer(out, buffer_size=16):
+        """
+        Write frames to a video on a background thread
+
+        Args:
+            out: An opened cv2.VideoWriter, or None to discard frames
+            buffer_size: Maximum number of frames waiting to be encoded
+
+        Yields:
+            callable: Takes one frame and queues it for writing
+        """
+        if out is None:
+            yield lambda frame: None
+            return
+
+        frames = queue.Queue(maxsize=buffer_size)
+        stop = threading.Event()
+        errors = []
+
+        def encode():
+            try:
+                while (frame := frames.get()) is not _END:
+                    out.write(frame)
+            except Exception as e:
+                # Stop accepting frames; the error is raised once the caller is done
+                errors.append(e)
+                stop.set()
+
+        thread = threading.Thread(target=encode, name='video-encode', daemon=True)
+        thread.start()
+        try:
+            yield lambda frame: _put(frames, frame, stop)
+        finally:
+            _put(frames, _END, stop)
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    @staticmethod
+    def write_annotations(video_path, annotations):
+        """
+        Write per-frame detections next to a video instead of rendering them into a copy
+
+        Args:
+            video_path: Path to the source video
+            annotations: List of per-frame dicts with frame number, timestamp and boxes
+
+        Returns:
+            Path: Path of the written annotations_<name>.json file
+        """
+        output_path = Path(video_path).parent / f"annotations_{Path(video_path).stem}.json"
+        with open(output_path, 'w') as f:
+            json.dump({'video': Path(video_path).name, 'frames': annotations}, f)
+        return output_path
@@ -0,0 +1,20 @@
+"""
+Gunicorn configuration for the Recognize web application
+"""
+import time
+
+
+def post_worker_init(worker):
+    """Run one detection per recognition service before the worker accepts traffic"""
+    app = worker.wsgi
+    for name in ('face_service', 'object_service'):
+        service = app.extensions.get(name)
+        if service is None or not service.is_available():
+            continue
+        start = time.perf_counter()
+        try:
+            service.warmup()
+        except Exception as e:
+            worker.log.warning("%s warmup failed: %s", name, e)
+            continue
+        worker.log.info("%s warmed up in %.2fs", name, time.perf_counter() - start)
@@ -2,11 +2,11 @@
 # Start Celery face detection worker
 
 echo "Starting Face Detection Worker..."
-echo "Queue: face_detection"
+echo "Queues: face_detection,face_video"
 echo "---"
 
 celery -A app.celery_app worker \
-    --queues=face_detection \
+    --queues=face_detection,face_video \
     --concurrency=2 \
     --loglevel=info \
     --hostname=face_worker@%h
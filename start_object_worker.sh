@@ -2,11 +2,11 @@
 # Start Celery object detection worker
 
 echo "Starting Object Detection Worker..."
-echo "Queue: object_detection"
+echo "Queues: object_detection,object_video"
 echo "---"
 
 celery -A app.celery_app worker \
-    --queues=object_detection \
+    --queues=object_detection,object_video \
     --concurrency=2 \
     --loglevel=info \
     --hostname=object_worker@%h
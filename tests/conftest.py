@@ -1,30 +1,61 @@
 """
 Pytest configuration and fixtures
 """
+import os
+
 import pytest
 
 from app import create_app
+from app.config import TestingConfig
+
+
+def pytest_configure(config):
+    """Skip writing .pytest_cache on CI, where the checkout and its cache are thrown away"""
+    if os.environ.get('CI'):
+        # The cache is written by these plugins at session end; blocking the
+        # cacheprovider module itself is too late once pytest has configured it
+        for name in ('lfplugin', 'nfplugin'):
+            config.pluginmanager.set_blocked(name)
+
+
+@pytest.fixture(scope='session')
+def testing_config():
+    """Configuration class the test app is built from"""
+    return TestingConfig
 
 
-@pytest.fixture
-def app():
-    """Create and configure a test Flask app instance"""
-    app = create_app()
+@pytest.fixture(scope='session')
+def app(testing_config):
+    """Create and configure a test Flask app instance, once per session"""
+    app = create_app(testing_config)
     app.config.update({
-        'TESTING': True,
         'SECRET_KEY': 'test-secret-key',
     })
     yield app
 
 
-@pytest.fixture
+@pytest.fixture(scope='module')
 def client(app):
-    """Create a test client for the app"""
+    """Create a test client for the app, shared within a test module"""
     return app.test_client()
 
 
-@pytest.fixture
+@pytest.fixture(scope='module')
 def app_context(app):
-    """Create an application context"""
+    """Create an application context, shared within a test module"""
     with app.app_context():
         yield app
+
+
+@pytest.fixture(scope='session')
+def facial_service():
+    """Face detection service with default models, shared by read-only tests"""
+    from app.services import FacialRecognitionService
+    return FacialRecognitionService()
+
+
+@pytest.fixture(scope='session')
+def object_service():
+    """Object detection service without models, shared by read-only tests"""
+    from app.services import ObjectDetectionService
+    return ObjectDetectionService()
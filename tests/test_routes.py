@@ -1,23 +1,14 @@
 """
 Tests for Flask application routes
 """
-import pytest
-
-from app import create_app
-from app.config import TestingConfig
-
-
-@pytest.fixture
-def app():
-    """Create application for testing"""
-    app = create_app(TestingConfig)
-    yield app
+import json
+import os
 
+import pytest
+from kombu.exceptions import OperationalError
 
-@pytest.fixture
-def client(app):
-    """Create test client"""
-    return app.test_client()
+from app import routes, routes_common
+from app.celery_app import celery_app
 
 
 def test_index_route(client):
@@ -36,22 +27,235 @@ def test_health_check(client):
     """Test the API health check endpoint"""
     response = client.get('/api/health')
     assert response.status_code == 200
-    data = response.get_json()
+    data = response.json
     assert data['success'] is True
-    assert 'services' in data['data']
+    assert data['data']['status'] == 'healthy'
+    assert isinstance(data['data']['services']['facial_recognition'], bool)
+
+
+def test_health_check_trailing_slash(client):
+    """Test routes match with a trailing slash instead of redirecting"""
+    response = client.get('/api/health/')
+    assert response.status_code == 200
+
 
+def test_cors_headers_api_only(client):
+    """Test CORS headers are sent for API routes but not HTML pages"""
+    headers = {'Origin': 'http://example.com'}
+    assert client.get('/api/health', headers=headers).headers['Access-Control-Allow-Origin'] == '*'
+    assert 'Access-Control-Allow-Origin' not in client.get('/', headers=headers).headers
 
-def test_face_detection_no_file(client):
-    """Test face detection endpoint without file"""
-    response = client.post('/api/detect/face/image')
+
+@pytest.mark.parametrize('endpoint', ['/api/detect/face/image', '/api/detect/object/image'])
+def test_detection_no_file(client, endpoint):
+    """Test detection endpoints without file"""
+    response = client.post(endpoint)
     assert response.status_code == 400
-    data = response.get_json()
+    data = response.json
     assert data['success'] is False
 
 
-def test_object_detection_no_file(client):
-    """Test object detection endpoint without file"""
-    response = client.post('/api/detect/object/image')
+def test_raw_upload_invalid_type(client):
+    """Test raw body upload with a disallowed extension"""
+    response = client.post(
+        '/api/detect/face/image?filename=notes.txt',
+        data=b'not an image',
+        content_type='application/octet-stream'
+    )
     assert response.status_code == 400
-    data = response.get_json()
+    data = response.json
     assert data['success'] is False
+
+
+@pytest.mark.parametrize('frame_skip', ['abc', '0'])
+def test_video_invalid_frame_skip(client, frame_skip):
+    """Test video upload with a frame skip that is not a positive integer"""
+    response = client.post(
+        f'/api/detect/face/video?filename=clip.mp4&frame_skip={frame_skip}',
+        data=b'video',
+        content_type='application/octet-stream'
+    )
+    assert response.status_code == 400
+    assert 'frame_skip' in response.json['message']
+
+
+class _FakeTask:
+    """Stand-in for a Celery task that records what was queued"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.queued = []
+
+    def apply_async(self, args):
+        if self.error:
+            raise self.error
+        self.queued.append(args)
+        return _FakeResult('PENDING')
+
+
+def _post_video(client, tmp_path, monkeypatch, task):
+    """Upload a raw-body video with the task queue replaced by task"""
+    monkeypatch.setattr(routes_common, '_UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(routes, 'get_celery_tasks', lambda: {'face_video': task})
+    return client.post(
+        '/api/detect/face/video?filename=clip.mp4&frame_skip=3',
+        data=b'video',
+        content_type='application/octet-stream'
+    )
+
+
+def test_video_queued(client, tmp_path, monkeypatch):
+    """Test video uploads are queued with a 202 pointing at the task status"""
+    task = _FakeTask()
+    response = _post_video(client, tmp_path, monkeypatch, task)
+    assert response.status_code == 202
+    assert response.headers['Location'] == '/api/task/abc123'
+    data = response.json['data']
+    assert data == {
+        'task_id': 'abc123',
+        'status': 'queued',
+        'message': 'Face detection task queued. Use task_id to check status.'
+    }
+    [(filepath, frame_skip)] = task.queued
+    assert frame_skip == 3
+    assert os.path.dirname(filepath) == str(tmp_path)
+
+
+def test_video_queue_unavailable(client, tmp_path, monkeypatch):
+    """Test an unreachable broker gives a 503 and removes the upload"""
+    task = _FakeTask(error=OperationalError('connection refused'))
+    response = _post_video(client, tmp_path, monkeypatch, task)
+    assert response.status_code == 503
+    assert response.json['message'] == 'Task queue not available'
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize('task_name,queue', [
+    ('app.tasks.face_tasks.detect_faces_in_image', 'face_detection'),
+    ('app.tasks.face_tasks.detect_faces_in_video', 'face_video'),
+    ('app.tasks.object_tasks.detect_objects_in_image', 'object_detection'),
+    ('app.tasks.object_tasks.detect_objects_in_video', 'object_video'),
+])
+def test_task_routing(task_name, queue):
+    """Test each detection task is routed to the queue for its workload"""
+    assert celery_app.amqp.router.route({}, task_name, (), {})['queue'].name == queue
+
+
+def test_api_error_handler(client, monkeypatch):
+    """Test unexpected errors in API views become JSON 500 responses"""
+    def fail(*args):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(routes, 'receive_upload', fail)
+    response = client.post('/api/detect/face/image?filename=face.jpg', data=b'image')
+    assert response.status_code == 500
+    data = response.json
+    assert data['success'] is False
+    assert data['message'] == 'disk full'
+
+
+def test_download_x_accel_redirect(client, monkeypatch):
+    """Test downloads are handed off to nginx when a redirect prefix is set"""
+    monkeypatch.setattr(routes_common, '_X_ACCEL_PREFIX', '/_internal_uploads/')
+    response = client.get('/api/uploads/annotated_clip.mp4')
+    assert response.status_code == 200
+    assert response.headers['X-Accel-Redirect'] == '/_internal_uploads/annotated_clip.mp4'
+    assert response.mimetype == 'video/mp4'
+    assert response.data == b''
+
+
+class _FakeResult:
+    """Stand-in for celery.result.AsyncResult"""
+
+    id = 'abc123'
+
+    def __init__(self, state, info=None):
+        self.state = state
+        self.info = info
+        self.result = info
+
+
+@pytest.mark.parametrize('state,info,field,expected', [
+    ('PENDING', None, 'status', 'Task is waiting in queue...'),
+    ('STARTED', None, 'status', 'Task has started...'),
+    ('SUCCESS', {'success': True}, 'result', {'success': True}),
+    ('RETRY', None, 'status', 'Unknown state'),
+])
+def test_task_status(client, monkeypatch, state, info, field, expected):
+    """Test task status reporting for each Celery state"""
+    monkeypatch.setattr(routes_common, '_AsyncResult', lambda task_id, app=None: _FakeResult(state, info))
+    response = client.get('/api/task/abc123')
+    assert response.status_code == 200
+    data = response.json['data']
+    assert data['state'] == state
+    assert data[field] == expected
+
+
+def test_task_status_started_progress(client, monkeypatch):
+    """Test a running task reports the latest progress its worker published"""
+    monkeypatch.setattr(routes_common, '_AsyncResult', lambda task_id, app=None: _FakeResult('STARTED'))
+    monkeypatch.setattr(
+        routes_common.TaskProgress, 'latest',
+        lambda task_id: {'state': 'PROCESSING', 'status': 'Processing video frames'}
+    )
+    response = client.get('/api/task/abc123')
+    assert response.json['data'] == {'state': 'PROCESSING', 'status': 'Processing video frames'}
+
+
+class _FakePubSub:
+    """Stand-in for redis.client.PubSub that replays a list of messages"""
+
+    def __init__(self, messages=()):
+        self.messages = list(messages)
+        self.closed = False
+
+    def get_message(self, timeout=None):
+        return self.messages.pop(0) if self.messages else None
+
+    def close(self):
+        self.closed = True
+
+
+def _sse_frames(response):
+    """Decode the data frames of an event stream response"""
+    return [
+        json.loads(frame[len('data: '):])
+        for frame in response.get_data(as_text=True).split('\n\n')
+        if frame.startswith('data: ')
+    ]
+
+
+def test_task_status_event_stream(client, monkeypatch):
+    """Test task status streaming as Server-Sent Events"""
+    pubsub = _FakePubSub()
+    monkeypatch.setattr(
+        routes_common, '_AsyncResult', lambda task_id, app=None: _FakeResult('SUCCESS', {'success': True})
+    )
+    monkeypatch.setattr(routes_common.TaskProgress, 'subscribe', lambda task_id, *channels: pubsub)
+    response = client.get('/api/task/abc123', headers={'Accept': 'text/event-stream'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert _sse_frames(response) == [{'state': 'SUCCESS', 'result': {'success': True}}]
+    assert pubsub.closed
+
+
+def test_task_status_event_stream_progress(client, monkeypatch):
+    """Test streamed progress messages are forwarded until the result arrives"""
+    progress = {'state': 'PROCESSING', 'status': 'Processing video frames'}
+    pubsub = _FakePubSub([
+        None,
+        {'channel': b'task:abc123:progress', 'data': json.dumps(progress).encode()},
+        {'channel': b'celery-task-meta-abc123', 'data': b'{}'},
+    ])
+    states = iter([_FakeResult('STARTED'), _FakeResult('SUCCESS', {'success': True})])
+    monkeypatch.setattr(routes_common, '_AsyncResult', lambda task_id, app=None: next(states))
+    monkeypatch.setattr(routes_common.TaskProgress, 'latest', lambda task_id: None)
+    monkeypatch.setattr(routes_common.TaskProgress, 'subscribe', lambda task_id, *channels: pubsub)
+    response = client.get('/api/task/abc123', headers={'Accept': 'text/event-stream'})
+    assert ': keep-alive' in response.get_data(as_text=True)
+    assert _sse_frames(response) == [
+        {'state': 'STARTED', 'status': 'Task has started...'},
+        progress,
+        {'state': 'SUCCESS', 'result': {'success': True}},
+    ]
+    assert pubsub.closed
@@ -1,36 +1,351 @@
 """
 Tests for service modules
 """
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
 
+import cv2
+import numpy as np
 import pytest
 
-from app.services import FacialRecognitionService, ObjectDetectionService
+from app.services import FacialRecognitionService, ObjectDetectionService, object_detection
 
 
-def test_facial_recognition_service_init():
+def test_facial_recognition_service_init(facial_service):
     """Test facial recognition service initialization"""
+    assert facial_service is not None
+    assert hasattr(facial_service, 'face_cascade')
+
+
+def test_facial_recognition_missing_model_falls_back(tmp_path):
+    """Test a missing YuNet model falls back to the Haar cascade"""
+    service = FacialRecognitionService(model_path=tmp_path / 'missing.onnx')
+    assert service.face_detector is None
+    assert service.face_cascade is not None
+    assert service._detect(np.zeros((48, 64, 3), dtype=np.uint8)) == []
+
+
+def test_facial_recognition_downscales_large_images():
+    """Test the cascade runs locked on a downscaled copy and boxes map back to the original"""
+    class FakeCascade:
+        def detectMultiScale(self, gray, **kwargs):
+            assert service._detector_lock.locked()
+            self.shape = gray.shape
+            self.min_size = kwargs['minSize']
+            return [(100, 50, 40, 40)]
+
+    service = FacialRecognitionService()
+    service.face_cascade = FakeCascade()
+    faces = service._detect(np.zeros((1080, 1920, 3), dtype=np.uint8))
+    assert service.face_cascade.shape == (540, 960)
+    assert service.face_cascade.min_size == (15, 15)
+    assert faces == [(200, 100, 80, 80, 1.0)]
+
+
+def test_facial_recognition_concurrent_sizes():
+    """Test concurrent images of different sizes each detect at their own input size"""
+    class FakeYuNet:
+        size = None
+
+        def setInputSize(self, size):
+            self.size = size
+
+        def detect(self, image):
+            time.sleep(0.005)
+            # One face spanning the input size the detector was set to
+            return 1, np.array([[0, 0, *self.size, *[0] * 10, 0.9]], dtype=np.float32)
+
     service = FacialRecognitionService()
-    assert service is not None
-    assert hasattr(service, 'face_cascade')
+    service.face_detector = FakeYuNet()
+    images = [np.zeros((48, 64, 3), dtype=np.uint8), np.zeros((90, 120, 3), dtype=np.uint8)] * 8
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(service._detect, images))
+    for image, faces in zip(images, results):
+        assert faces == [(0, 0, image.shape[1], image.shape[0], pytest.approx(0.9))]
 
 
-def test_object_detection_service_init():
+def test_object_detection_service_init(object_service):
     """Test object detection service initialization"""
-    service = ObjectDetectionService()
-    assert service is not None
-    assert hasattr(service, 'net')
+    assert object_service is not None
+    assert hasattr(object_service, 'net')
 
 
-def test_facial_recognition_is_available():
+def test_facial_recognition_is_available(facial_service):
     """Test if facial recognition service is available"""
-    service = FacialRecognitionService()
     # Service should be available with default cascade
-    assert isinstance(service.is_available(), bool)
+    assert isinstance(facial_service.is_available(), bool)
 
 
-def test_object_detection_is_available():
+def test_object_detection_is_available(object_service):
     """Test if object detection service is available"""
-    service = ObjectDetectionService()
     # Service may not be available without models
-    assert isinstance(service.is_available(), bool)
+    assert isinstance(object_service.is_available(), bool)
+
+
+# Minimal YOLO network: a 32x downsample and a 1x1 convolution feeding one detection
+# layer, so a 416x416 input yields a 13x13 grid like YOLOv3's coarsest scale
+_TINY_YOLO_CFG = """
+[net]
+width=416
+height=416
+channels=3
+
+[maxpool]
+size=32
+stride=32
+
+[convolutional]
+filters=255
+size=1
+stride=1
+pad=0
+activation=linear
+
+[yolo]
+mask=0,1,2
+anchors=10,13,16,30,33,23
+classes=80
+num=3
+"""
+
+
+@pytest.fixture
+def tiny_yolo(tmp_path):
+    """Write a tiny randomly weighted YOLO model and return its file paths"""
+    rng = np.random.default_rng(0)
+    weights = tmp_path / 'tiny.weights'
+    header = np.array([0, 2, 0], np.int32).tobytes() + np.zeros(1, np.int64).tobytes()
+    weights.write_bytes(header + rng.normal(0, 1, 255 * 4).astype(np.float32).tobytes())
+    config = tmp_path / 'tiny.cfg'
+    config.write_text(_TINY_YOLO_CFG)
+    names = tmp_path / 'coco.names'
+    names.write_text('\n'.join(f'class{i}' for i in range(80)))
+    return {'weights_path': str(weights), 'config_path': str(config), 'names_path': str(names)}
+
+
+@pytest.fixture
+def sample_video(tmp_path):
+    """Write a short random video and return its path"""
+    rng = np.random.default_rng(1)
+    path = tmp_path / 'clip.avi'
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    for _ in range(23):
+        writer.write(rng.integers(0, 255, (48, 64, 3), dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_object_detection_video_batching(tiny_yolo, sample_video):
+    """Test batched video inference matches frame-by-frame inference"""
+    results = []
+    for batch_size in (1, 4):
+        service = ObjectDetectionService(**tiny_yolo, confidence_threshold=0.3, batch_size=batch_size)
+        assert service.is_available()
+        result = service.detect_objects_in_video(sample_video, frame_skip=2)
+        assert result['success'], result.get('error')
+        results.append(result)
+
+    assert results[0]['frames_with_objects']
+    assert results[0]['frames_with_objects'] == results[1]['frames_with_objects']
+    assert results[0]['object_summary'] == results[1]['object_summary']
+
+
+def test_object_detection_video_sidecar(tiny_yolo, sample_video):
+    """Test annotate_video=False writes a JSON sidecar instead of an annotated video"""
+    service = ObjectDetectionService(**tiny_yolo, confidence_threshold=0.3, annotate_video=False)
+    result = service.detect_objects_in_video(sample_video, frame_skip=2)
+    assert result['success'], result.get('error')
+    assert 'annotated_video' not in result
+    assert not (sample_video.parent / f'annotated_{sample_video.name}').exists()
+
+    with open(result['annotations']) as f:
+        annotations = json.load(f)
+    assert annotations['video'] == sample_video.name
+    assert [frame['frame'] for frame in annotations['frames']] == \
+        [frame['frame'] for frame in result['frames_with_objects']]
+    assert all(len(obj['bbox']) == 4 for frame in annotations['frames'] for obj in frame['objects'])
+
+
+def test_services_warmup(tiny_yolo, object_service):
+    """Test warmup runs detection on loaded services and skips ones without models"""
+    FacialRecognitionService().warmup()
+    ObjectDetectionService(**tiny_yolo).warmup()
+    object_service.warmup()
+
+
+def test_object_detection_blob_reuse():
+    """Test the reused input blob matches a freshly allocated one"""
+    service = ObjectDetectionService(batch_size=4)
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (48, 64, 3), dtype=np.uint8) for _ in range(3)]
+    expected = cv2.dnn.blobFromImages(images, 1/255.0, (416, 416), swapRB=True, crop=False)
+    np.testing.assert_array_equal(service._blob(images), expected)
+    np.testing.assert_array_equal(service._blob(images[:1]), expected[:1])
+
+
+def test_object_detection_fixed_batch_fallback():
+    """Test a fixed-batch ONNX model drops to one frame per pass on its first batch"""
+    class FixedBatchNet:
+        def setInput(self, blob):
+            self.batch = len(blob)
+
+        def forward(self, layers):
+            if self.batch != 1:
+                raise cv2.error('fixed batch')
+            return [np.full((1, 84, 2), len(calls), dtype=np.float32)]
+
+    calls = []
+    service = ObjectDetectionService(batch_size=4, model_format='yolov8')
+    service.net = FixedBatchNet()
+    forward = service._forward
+    service._forward = lambda images: calls.append(len(images)) or forward(images)
+    images = [np.zeros((48, 64, 3), dtype=np.uint8)] * 3
+    outputs = service._forward(images)
+    assert service.batch_size == 1
+    assert calls == [3, 1, 1, 1]
+    assert [output[0][0, 0] for output in outputs] == [2, 3, 4]
+
+
+def test_object_detection_postprocess():
+    """Test decoding YOLO rows into pixel boxes above the threshold"""
+    service = ObjectDetectionService(confidence_threshold=0.5)
+    rows = np.zeros((3, 85), dtype=np.float32)
+    rows[0, :4] = (0.5, 0.5, 0.25, 0.5)
+    rows[0, 5 + 2] = 0.9
+    rows[1, :4] = (0.1, 0.1, 0.1, 0.1)
+    rows[1, 5 + 7] = 0.4
+    detections = service._postprocess([rows[:1], rows[1:]], 640, 480)
+    assert len(detections) == 1
+    assert detections[0][:5] == (240, 120, 160, 240, 2)
+    assert detections[0][5] == pytest.approx(0.9)
+
+
+def test_object_detection_postprocess_yolov8():
+    """Test decoding YOLOv8's transposed output with boxes in input pixels"""
+    service = ObjectDetectionService(confidence_threshold=0.5, model_format='yolov8')
+    output = np.zeros((1, 84, 2), dtype=np.float32)
+    output[0, :4, 0] = (320, 320, 160, 320)
+    output[0, 4 + 2, 0] = 0.9
+    output[0, 4 + 5, 1] = 0.3
+    detections = service._postprocess([output], 1280, 640)
+    assert len(detections) == 1
+    assert detections[0][:5] == (480, 160, 320, 320, 2)
+
+
+def test_object_detection_nms_per_class():
+    """Test overlapping boxes survive NMS when their classes differ"""
+    service = ObjectDetectionService(confidence_threshold=0.5)
+    rows = np.zeros((3, 85), dtype=np.float32)
+    rows[:, :4] = (0.5, 0.5, 0.25, 0.5)
+    rows[0, 5 + 0] = 0.9
+    rows[1, 5 + 0] = 0.8
+    rows[2, 5 + 1] = 0.7
+    detections = service._postprocess([rows], 640, 480)
+    assert sorted(detection[4] for detection in detections) == [0, 1]
+
+
+def _fail_warmup(self):
+    raise cv2.error('no kernel image is available for execution on the device')
+
+
+def test_object_detection_batches_concurrent_images(tiny_yolo, tmp_path):
+    """Test concurrent image requests share forward passes and get their own results"""
+    rng = np.random.default_rng(2)
+    paths = []
+    for i in range(4):
+        path = tmp_path / f'image{i}.jpg'
+        cv2.imwrite(str(path), rng.integers(0, 256, (48 + 8 * i, 64, 3), dtype=np.uint8))
+        paths.append(path)
+
+    def detect(service, path):
+        result = service.detect_objects_in_image(path)
+        assert result['success'], result.get('error')
+        return result['objects']
+
+    sequential = ObjectDetectionService(**tiny_yolo, confidence_threshold=0.3)
+    expected = [detect(sequential, path) for path in paths]
+
+    service = ObjectDetectionService(**tiny_yolo, confidence_threshold=0.3, batch_window=0.5)
+    batch_sizes = []
+    forward = service._forward
+    service._forward = lambda images: batch_sizes.append(len(images)) or forward(images)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda path: detect(service, path), paths))
+
+    assert results == expected
+    assert any(expected)
+    assert sum(batch_sizes) == 4 and len(batch_sizes) < 4
+
+
+def test_object_detection_image_without_batch_window():
+    """Test images run on the calling thread when no batch window is set"""
+    service = ObjectDetectionService()
+    service._forward = lambda images: [[threading.current_thread().name]]
+    assert service._forward_image(np.zeros((48, 64, 3), dtype=np.uint8)) == ['MainThread']
+    assert service._batcher is None
+
+
+def test_object_detection_batcher_timeout_and_idle_exit(monkeypatch):
+    """Test a stuck batch times out its requests and the batcher exits once idle"""
+    monkeypatch.setattr(ObjectDetectionService, 'IMAGE_RESULT_TIMEOUT', 0.05)
+    monkeypatch.setattr(ObjectDetectionService, 'BATCHER_IDLE_TIMEOUT', 0.05)
+    service = ObjectDetectionService(batch_window=0.01)
+    service._forward = lambda images: time.sleep(0.2) or [[None]] * len(images)
+    with pytest.raises(FutureTimeoutError):
+        service._forward_image(np.zeros((48, 64, 3), dtype=np.uint8))
+    batcher = service._batcher
+    batcher.join(timeout=2)
+    assert not batcher.is_alive()
+    assert service._batcher is None
+
+
+def test_object_detection_cuda_without_device(tiny_yolo, monkeypatch, caplog):
+    """Test use_cuda without a CUDA device stays on the CPU without a warmup pass"""
+    monkeypatch.setattr(object_detection, '_cuda_device_count', lambda: 0)
+    monkeypatch.setattr(ObjectDetectionService, '_warmup', _fail_warmup)
+    service = ObjectDetectionService(**tiny_yolo, use_cuda=True)
+    assert service.is_available()
+    assert 'no CUDA device is available' in caplog.text
+
+
+def test_object_detection_cuda_target_fallback(tiny_yolo, monkeypatch, caplog):
+    """Test a CUDA device whose targets fail the warmup falls back to the CPU"""
+    monkeypatch.setattr(object_detection, '_cuda_device_count', lambda: 1)
+    monkeypatch.setattr(object_detection, '_cuda_compute_capability', lambda: 7)
+    monkeypatch.setattr(ObjectDetectionService, '_warmup', _fail_warmup)
+    service = ObjectDetectionService(**tiny_yolo, use_cuda=True)
+    assert service.is_available()
+    assert caplog.text.count('unavailable') == 2
+
+
+def test_object_detection_cuda_fp16_needs_tensor_cores(tiny_yolo, monkeypatch, caplog):
+    """Test devices below compute capability 7.0 skip the FP16 target"""
+    monkeypatch.setattr(object_detection, '_cuda_device_count', lambda: 1)
+    monkeypatch.setattr(object_detection, '_cuda_compute_capability', lambda: 6)
+    monkeypatch.setattr(ObjectDetectionService, '_warmup', _fail_warmup)
+    ObjectDetectionService(**tiny_yolo, use_cuda=True)
+    assert caplog.text.count('unavailable') == 1
+    assert f'target {cv2.dnn.DNN_TARGET_CUDA}' in caplog.text
+
+
+def test_object_detection_load_failure(tiny_yolo, monkeypatch):
+    """Test a model that fails to set up is not reported as available"""
+    def fail(self, use_cuda):
+        raise cv2.error('backend setup failed')
+
+    monkeypatch.setattr(ObjectDetectionService, '_configure_backend', fail)
+    assert not ObjectDetectionService(**tiny_yolo).is_available()
+
+
+def test_task_service_reused(monkeypatch):
+    """Test tasks share one service per worker process instead of reloading the model"""
+    from app.tasks import face_tasks
+
+    monkeypatch.setattr(face_tasks, '_service', None)
+    service = face_tasks._get_service()
+    assert isinstance(service, FacialRecognitionService)
+    assert face_tasks._get_service() is service
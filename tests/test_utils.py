@@ -1,63 +1,201 @@
 """
 Tests for utility modules
 """
+import io
+import json
+import os
+import stat
+import threading
 from pathlib import Path
 
+import numpy as np
 import pytest
+from flask.json.provider import DefaultJSONProvider
 
-from app.utils import FileHandler, ResponseHandler
+from app import ensure_dirs
+from app.utils import FileHandler, ResponseHandler, TaskProgress, VideoIO, file_handler
 
 
-def test_file_handler_allowed_file():
+@pytest.mark.parametrize('filename,expected', [
+    ('test.jpg', True),
+    ('test.txt', False),
+    ('test', False),
+])
+def test_file_handler_allowed_file(filename, expected):
     """Test file extension validation"""
-    assert FileHandler.allowed_file('test.jpg', {'jpg', 'png'}) is True
-    assert FileHandler.allowed_file('test.txt', {'jpg', 'png'}) is False
-    assert FileHandler.allowed_file('test', {'jpg', 'png'}) is False
+    assert FileHandler.allowed_file(filename, frozenset({'jpg', 'png'})) is expected
 
 
-def test_file_handler_get_file_extension():
+def test_file_handler_extension_pattern():
+    """Test compiled extension validation matches allowed_file"""
+    pattern = FileHandler.extension_pattern({'jpg', 'png'})
+    assert pattern.search('test.jpg')
+    assert pattern.search('test.PNG')
+    assert not pattern.search('test.txt')
+    assert not pattern.search('test')
+    assert not pattern.search('test.jpg.exe')
+
+
+@pytest.mark.parametrize('filename,expected', [
+    ('test.jpg', 'jpg'),
+    ('test.PNG', 'png'),
+    ('test', ''),
+])
+def test_file_handler_get_file_extension(filename, expected):
     """Test getting file extension"""
-    assert FileHandler.get_file_extension('test.jpg') == 'jpg'
-    assert FileHandler.get_file_extension('test.PNG') == 'png'
-    assert FileHandler.get_file_extension('test') == ''
+    assert FileHandler.get_file_extension(filename) == expected
 
 
-def test_file_handler_is_image():
+@pytest.mark.parametrize('filename,expected', [
+    ('photo.jpg', True),
+    ('photo.png', True),
+    ('video.mp4', False),
+])
+def test_file_handler_is_image(filename, expected):
     """Test image file detection"""
-    assert FileHandler.is_image('photo.jpg') is True
-    assert FileHandler.is_image('photo.png') is True
-    assert FileHandler.is_image('video.mp4') is False
+    assert FileHandler.is_image(filename) is expected
 
 
-def test_file_handler_is_video():
+@pytest.mark.parametrize('filename,expected', [
+    ('video.mp4', True),
+    ('video.avi', True),
+    ('photo.jpg', False),
+])
+def test_file_handler_is_video(filename, expected):
     """Test video file detection"""
-    assert FileHandler.is_video('video.mp4') is True
-    assert FileHandler.is_video('video.avi') is True
-    assert FileHandler.is_video('photo.jpg') is False
-
-
-def test_response_handler_success(app_context):
-    """Test success response creation"""
-    response, status_code = ResponseHandler.success({'key': 'value'})
-    assert status_code == 200
+    assert FileHandler.is_video(filename) is expected
+
+
+def test_file_handler_stream_upload_to_disk(tmp_path):
+    """Test streaming a raw body to disk"""
+    payload = b'x' * 2500
+    filepath = FileHandler.stream_upload_to_disk(
+        io.BytesIO(payload), '../clip.mp4', str(tmp_path), chunk_size=1024
+    )
+    saved = Path(filepath)
+    assert saved.parent == tmp_path
+    assert saved.name.startswith('clip_')
+    assert saved.suffix == '.mp4'
+    assert saved.read_bytes() == payload
+    assert list(tmp_path.iterdir()) == [saved]
+
+
+def test_file_handler_saved_file_mode(tmp_path, monkeypatch):
+    """Test saved uploads get the umask-based mode rather than mkstemp's 0600"""
+    monkeypatch.setattr(file_handler, '_UMASK', 0o022)
+    filepath = FileHandler.stream_upload_to_disk(io.BytesIO(b'data'), 'a.jpg', str(tmp_path))
+    assert stat.S_IMODE(os.stat(filepath).st_mode) == 0o644
+
+
+def test_file_handler_recreates_removed_folder(tmp_path):
+    """Test uploads still save after the upload folder is removed"""
+    folder = tmp_path / 'uploads'
+    filepath = FileHandler.stream_upload_to_disk(io.BytesIO(b'data'), 'a.jpg', str(folder))
+    assert Path(filepath).read_bytes() == b'data'
+
+
+@pytest.mark.skipif(not hasattr(os, 'posix_fadvise'), reason='posix_fadvise unavailable')
+def test_file_handler_drop_cache(tmp_path, monkeypatch):
+    """Test drop_cache evicts the whole written file from the page cache"""
+    calls = []
+    monkeypatch.setattr(os, 'posix_fadvise', lambda *args: calls.append(args[1:]))
+    filepath = FileHandler.stream_upload_to_disk(
+        io.BytesIO(b'data'), 'clip.mp4', str(tmp_path), drop_cache=True
+    )
+    assert Path(filepath).read_bytes() == b'data'
+    assert calls == [(0, 0, os.POSIX_FADV_DONTNEED)]
+
+
+def test_ensure_dirs(tmp_path):
+    """Test directories are created once, nested ones by their parent's makedirs"""
+    upload = tmp_path / 'uploads'
+    processed = upload / 'processed'
+    ensure_dirs(str(upload), str(processed))
+    assert processed.is_dir()
+
+    # Remembered for the life of the process - no filesystem calls on repeat
+    processed.rmdir()
+    ensure_dirs(str(upload), str(processed))
+    assert not processed.exists()
+
+
+@pytest.mark.parametrize('method,args,expected_status,success,message', [
+    ('success', ({'key': 'value'},), 200, True, 'Success'),
+    ('error', ('Test error', 400), 400, False, 'Test error'),
+    ('not_found', ('File',), 404, False, 'File not found'),
+])
+def test_response_handler(app_context, method, args, expected_status, success, message):
+    """Test success and error response creation"""
+    response, status_code = getattr(ResponseHandler, method)(*args)
+    assert status_code == expected_status
     data = response.get_json()
-    assert data['success'] is True
-    assert 'data' in data
-
-
-def test_response_handler_error(app_context):
-    """Test error response creation"""
-    response, status_code = ResponseHandler.error('Test error', 400)
-    assert status_code == 400
+    assert data['success'] is success
+    assert data['message'] == message
+    assert ('data' in data) is success
+
+
+def test_json_provider_matches_flask(app_context):
+    """Test orjson responses decode to what Flask's provider produces"""
+    data = {'b': [1, 2.5], 'a': {'nested': None, 'text': 'caf\u00e9'}}
+    response = app_context.json.response(data)
+    assert response.mimetype == 'application/json'
+    assert response.get_data().endswith(b'\n')
+    assert json.loads(response.get_data()) == json.loads(DefaultJSONProvider(app_context).dumps(data))
+    assert app_context.json.dumps({'score': np.float32(0.5)}) == '{"score":0.5}'
+
+
+def test_response_handler_preformatted(app_context):
+    """Test success response creation from a byte template"""
+    template = b'{"success":true,"message":"Success","timestamp":"%s","data":{"key":%s}}'
+    response, status_code = ResponseHandler.preformatted(template, b'"value"', status_code=202)
+    assert status_code == 202
+    assert response.mimetype == 'application/json'
     data = response.get_json()
-    assert data['success'] is False
-    assert data['message'] == 'Test error'
-
-
-def test_response_handler_not_found(app_context):
-    """Test not found response creation"""
-    response, status_code = ResponseHandler.not_found('File')
-    assert status_code == 404
-    data = response.get_json()
-    assert data['success'] is False
-    assert 'not found' in data['message'].lower()
+    assert data['success'] is True
+    assert data['data'] == {'key': 'value'}
+
+
+def test_task_progress_tolerates_backend_errors(monkeypatch):
+    """Test progress reporting degrades quietly when Redis cannot be used"""
+    def no_redis():
+        raise ValueError('CELERY_RESULT_BACKEND is not a Redis URL')
+
+    monkeypatch.setattr(TaskProgress, 'client', no_redis)
+    TaskProgress.publish('abc123', 'Processing video frames')
+    assert TaskProgress.latest('abc123') is None
+    assert TaskProgress.subscribe('abc123') is None
+
+
+def test_video_io_round_trip(tmp_path):
+    """Test a video written by VideoIO reads back frame for frame"""
+    output_path = tmp_path / 'out.mp4'
+    out = VideoIO.open_writer(output_path, 10, (64, 48))
+    assert out.isOpened()
+    for value in range(0, 250, 50):
+        out.write(np.full((48, 64, 3), value, dtype=np.uint8))
+    out.release()
+
+    cap = VideoIO.open_capture(output_path)
+    assert cap.isOpened()
+    frames = 0
+    while cap.read()[0]:
+        frames += 1
+    cap.release()
+    assert frames == 5
+
+
+def test_video_io_read_frames_stops_early(tmp_path):
+    """Test abandoning read_frames part way stops its decode thread"""
+    output_path = tmp_path / 'out.mp4'
+    out = VideoIO.open_writer(output_path, 10, (64, 48))
+    with VideoIO.frame_writer(out) as write:
+        for _ in range(40):
+            write(np.zeros((48, 64, 3), dtype=np.uint8))
+    out.release()
+
+    cap = VideoIO.open_capture(output_path)
+    frames = VideoIO.read_frames(cap, buffer_size=2)
+    assert next(frames).shape == (48, 64, 3)
+    frames.close()
+    assert not any(thread.name == 'video-decode' for thread in threading.enumerate())
+    cap.release()